@@ -105,6 +105,14 @@ def data_management_page():
                 mime='application/zip'
             )
             
+            # One sheet per template, for uploading every dataset in a single workbook
+            st.download_button(
+                label="📚 Download All Templates (Workbook)",
+                data=data_manager.download_workbook_template(),
+                file_name="ai_initiatives_templates.xlsx",
+                mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+            )
+            
             st.info("""
             **Instructions:**
             1. Download the template(s) you need
@@ -131,14 +139,17 @@ def data_management_page():
         # File upload
         uploaded_file = st.file_uploader(
             f"Upload {data_type} Data",
-            type=['csv'],
-            help=f"Upload CSV file with {data_type} data"
+            type=['csv', 'xlsx'],
+            help=f"Upload a CSV file or Excel workbook with {data_type} data"
         )
         
         if uploaded_file is not None:
             try:
-                # Read uploaded file
-                uploaded_df = pd.read_csv(uploaded_file)
+                # Read uploaded file; workbooks are read directly, without converting to CSV first
+                if uploaded_file.name.lower().endswith('.xlsx'):
+                    uploaded_df = pd.read_excel(uploaded_file).dropna(how='all')
+                else:
+                    uploaded_df = pd.read_csv(uploaded_file)
                 
                 st.write("**Preview of uploaded data:**")
                 st.dataframe(uploaded_df.head())
@@ -149,17 +160,29 @@ def data_management_page():
                 if is_valid:
                     st.success(f"✅ {message}")
                     
-                    # Load existing data
-                    existing_df = data_manager.load_existing_data(data_type)
+                    # Row count from the catalog, so no stored data is read on each rerun
+                    catalog_entry = data_manager.get_catalog(data_type)
                     
-                    st.write(f"**Current data:** {len(existing_df)} records")
+                    st.write(f"**Current data:** {catalog_entry['records'] if catalog_entry else 0} records")
                     st.write(f"**New data:** {len(uploaded_df)} records")
                     
-                    # Operation selection
+                    # Preview merge deduplication against the stored row-hash index
+                    duplicates = data_manager.count_duplicates(uploaded_df, data_type)
+                    st.write(f"**Duplicates:** {duplicates['already_stored']} already stored, "
+                             f"{duplicates['within_upload']} repeated within the upload "
+                             f"({duplicates['new']} new records would be merged)")
+                    
+                    # Operation selection; upsert is offered for templates with a natural key
+                    operations = ["Merge with existing data", "Replace all existing data"]
+                    key_columns = data_manager.get_template_info(data_type)['key']
+                    if key_columns:
+                        operations.insert(1, "Upsert by key (update matching records)")
                     operation = st.radio(
                         "Choose operation:",
-                        ["Merge with existing data", "Replace all existing data"],
-                        help="Merge: Add new data to existing data. Replace: Delete all existing data and use only new data."
+                        operations,
+                        help="Merge: Add new data to existing data. Upsert: Overwrite records whose key "
+                             f"({', '.join(key_columns) or 'none'}) already exists and add the rest. "
+                             "Replace: Delete all existing data and use only new data."
                     )
                     
                     col1, col2 = st.columns(2)
@@ -167,20 +190,24 @@ def data_management_page():
                     with col1:
                         if st.button("🚀 Execute Upload", type="primary"):
                             if operation == "Merge with existing data":
-                                result_df, success, msg = data_manager.merge_data(existing_df, uploaded_df, data_type, user_info)
+                                # Only new rows are appended; existing data is not rewritten
+                                result_df, success, msg = data_manager.append_data(uploaded_df, data_type, user_info)
+                                save_success, save_msg = success, "New records appended to storage"
+                            elif operation.startswith("Upsert"):
+                                # Matching records are overwritten in place; the data is saved by upsert_data
+                                result_df, success, msg = data_manager.upsert_data(uploaded_df, data_type, user_info)
+                                save_success, save_msg = success, "Records upserted to storage"
                             else:
                                 result_df, success, msg = data_manager.replace_data(uploaded_df, data_type, user_info)
+                                if success:
+                                    # Save the data
+                                    save_success, save_msg = data_manager.save_data(result_df, data_type, user_info, "REPLACE")
                             
                             if success:
-                                # Save the data
-                                save_success, save_msg = data_manager.save_data(result_df, data_type)
                                 if save_success:
                                     st.success(f"✅ {msg}")
                                     st.success(f"✅ {save_msg}")
                                     st.balloons()
-                                    
-                                    # Clear cache to reload data
-                                    st.cache_data.clear()
                                 else:
                                     st.error(f"❌ {save_msg}")
                             else:
@@ -192,7 +219,6 @@ def data_management_page():
                                 success, msg = data_manager.delete_data(data_type, user_info)
                                 if success:
                                     st.success(f"✅ {msg}")
-                                    st.cache_data.clear()
                                 else:
                                     st.error(f"❌ {msg}")
                 
@@ -203,6 +229,46 @@ def data_management_page():
                     
             except Exception as e:
                 st.error(f"❌ Error reading uploaded file: {e}")
+        
+        # All datasets at once: a workbook with one sheet per template, or a ZIP of template CSVs
+        st.markdown("---")
+        st.write("**📚 Upload All Datasets at Once**")
+        workbook_file = st.file_uploader(
+            "Upload Combined Workbook or ZIP",
+            type=['xlsx', 'zip'],
+            key="workbook_upload",
+            help="A workbook with one sheet per template, or a ZIP of template CSVs "
+                 "laid out like 'Download All Templates (ZIP)'"
+        )
+        
+        if workbook_file is not None:
+            workbook_operation = st.radio(
+                "Choose operation for every dataset:",
+                ["Merge with existing data", "Replace all existing data"],
+                key="workbook_operation"
+            )
+            if st.button("🚀 Ingest All", type="primary", key="ingest_workbook"):
+                mode = "merge" if workbook_operation.startswith("Merge") else "replace"
+                if workbook_file.name.lower().endswith('.zip'):
+                    # Files are processed in parallel; one progress bar for the whole archive
+                    progress_bar = st.progress(0.0, text="Ingesting ZIP...")
+                    success, msg, results = data_manager.ingest_zip(
+                        workbook_file, user_info, mode,
+                        progress=lambda done, total, name: progress_bar.progress(done / total, text=f"{done}/{total} done ({name})")
+                    )
+                else:
+                    with st.spinner("Ingesting workbook..."):
+                        success, msg, results = data_manager.ingest_workbook(workbook_file, user_info, mode)
+                
+                for sheet_type, (sheet_success, sheet_msg) in results.items():
+                    if sheet_success:
+                        st.success(f"✅ {sheet_type}: {sheet_msg}")
+                    else:
+                        st.error(f"❌ {sheet_type}: {sheet_msg}")
+                if success:
+                    st.success(f"✅ {msg}")
+                else:
+                    st.error(f"❌ {msg}")
     
     with tab3:
         st.subheader("🗂️ Data Summary")
@@ -228,7 +294,6 @@ def data_management_page():
         
         # Refresh button
         if st.button("🔄 Refresh Summary"):
-            st.cache_data.clear()
             st.experimental_rerun()
     
     with tab4:
@@ -7,7 +7,7 @@ import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import warnings
 warnings.filterwarnings('ignore')
-from data_manager import DataManager
+from data_manager import DataManager, yes_mask
 import os
 from datetime import datetime
 # Removed unused imports: seaborn and matplotlib
@@ -59,27 +59,24 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 def load_data():
-    """Load all data using DataManager"""
+    """Load all data using DataManager's shared, fingerprint-keyed cache"""
     try:
         data_manager = DataManager()
         
-        # Load all data types
-        ai_tutor_data = data_manager.load_existing_data('AI Tutor')
-        ai_mentor_data = data_manager.load_existing_data('AI Mentor')
-        ai_impact_data = data_manager.load_existing_data('AI Impact')
-        ai_tkt_data = data_manager.load_existing_data('AI TKT')
-        unit_performance_data = data_manager.load_existing_data('Unit Performance')
-        cr_data = data_manager.load_existing_data('CR (Corporate Relations)')
-        prp_data = data_manager.load_existing_data('PRP (Placement Readiness Program)')
+        # Load all data types in parallel (unchanged files are served from the cache)
+        data = data_manager.load_many([
+            'AI Tutor', 'AI Mentor', 'AI Impact', 'AI TKT', 'Unit Performance',
+            'CR (Corporate Relations)', 'PRP (Placement Readiness Program)'
+        ])
         
         return {
-            'ai_tutor': ai_tutor_data,
-            'ai_mentor': ai_mentor_data,
-            'ai_impact': ai_impact_data,
-            'ai_tkt': ai_tkt_data,
-            'unit_performance': unit_performance_data,
-            'cr': cr_data,
-            'prp': prp_data
+            'ai_tutor': data['AI Tutor'],
+            'ai_mentor': data['AI Mentor'],
+            'ai_impact': data['AI Impact'],
+            'ai_tkt': data['AI TKT'],
+            'unit_performance': data['Unit Performance'],
+            'cr': data['CR (Corporate Relations)'],
+            'prp': data['PRP (Placement Readiness Program)']
         }
     except Exception as e:
         st.error(f"Error loading data: {e}")
@@ -147,7 +144,7 @@ def enhanced_ai_tutor_analysis(data, program_filter=None, cohort_filter=None):
     st.subheader("👨‍🏫 Faculty Performance Analysis")
     
     # Faculty-wise analysis
-    faculty_analysis = filtered_data.groupby(['Faculty Name', 'Course(GCGM/MGM/GMBA)', 'Cohort']).agg({
+    faculty_analysis = filtered_data.groupby(['Faculty Name', 'Course(GCGM/MGM/GMBA)', 'Cohort'], observed=True).agg({
         'Faculty_Rating_provide by students': 'mean',
         'Average Score of AI Tutor Platform Quiz': 'mean',
         'No. of Quizzes_conducted': 'sum'
@@ -186,7 +183,7 @@ def enhanced_ai_tutor_analysis(data, program_filter=None, cohort_filter=None):
     # Requirement 3: Total Units in which AI Tutor is Implemented (Program-wise)
     st.subheader("📚 AI Tutor Implementation by Program")
     
-    program_implementation = filtered_data.groupby('Course(GCGM/MGM/GMBA)')['Unit_Name'].nunique().reset_index()
+    program_implementation = filtered_data.groupby('Course(GCGM/MGM/GMBA)', observed=True)['Unit_Name'].nunique().reset_index()
     program_implementation.columns = ['Program', 'Total_Subjects_Implemented']
     
     fig_implementation = px.pie(
@@ -205,7 +202,7 @@ def enhanced_ai_tutor_analysis(data, program_filter=None, cohort_filter=None):
     # Requirement 4: Key Insights - Highest and Lowest Average Quiz Scores
     st.subheader("🎯 Key Performance Insights")
     
-    subject_performance = filtered_data.groupby(['Unit_Name', 'Course(GCGM/MGM/GMBA)', 'Cohort', 'Faculty Name']).agg({
+    subject_performance = filtered_data.groupby(['Unit_Name', 'Course(GCGM/MGM/GMBA)', 'Cohort', 'Faculty Name'], observed=True).agg({
         'Average Score of AI Tutor Platform Quiz': 'mean'
     }).reset_index()
     
@@ -257,11 +254,14 @@ def enhanced_ai_tutor_analysis(data, program_filter=None, cohort_filter=None):
     if program_for_ranking != 'All':
         ranking_data = ranking_data[ranking_data['Course(GCGM/MGM/GMBA)'] == program_for_ranking]
     
-    subject_scores = ranking_data.groupby(['Unit_Name', 'Course(GCGM/MGM/GMBA)', 'Cohort']).agg({
+    subject_scores = ranking_data.groupby(['Unit_Name', 'Course(GCGM/MGM/GMBA)', 'Cohort'], observed=True).agg({
         'Average Score of AI Tutor Platform Quiz': 'mean'
     }).reset_index()
     
-    subject_scores['Display_Name'] = subject_scores['Unit_Name'] + ' (' + subject_scores['Course(GCGM/MGM/GMBA)'] + '_' + subject_scores['Cohort'] + ')'
+    subject_scores['Display_Name'] = (
+        subject_scores['Unit_Name'].astype(str) + ' (' + subject_scores['Course(GCGM/MGM/GMBA)'].astype(str)
+        + '_' + subject_scores['Cohort'].astype(str) + ')'
+    )
     subject_scores = subject_scores.sort_values('Average Score of AI Tutor Platform Quiz', ascending=False)
     
     col1, col2 = st.columns(2)
@@ -348,7 +348,7 @@ def enhanced_ai_tutor_analysis(data, program_filter=None, cohort_filter=None):
     faculty_data = filtered_data[filtered_data['Faculty Name'] == selected_faculty]
     
     # Faculty performance across subjects and cohorts
-    faculty_performance = faculty_data.groupby(['Unit_Name', 'Cohort']).agg({
+    faculty_performance = faculty_data.groupby(['Unit_Name', 'Cohort'], observed=True).agg({
         'Average Score of AI Tutor Platform Quiz': 'mean'
     }).reset_index()
     
@@ -367,7 +367,7 @@ def enhanced_ai_tutor_analysis(data, program_filter=None, cohort_filter=None):
     # Requirement 8: Faculty Feedback Analysis
     st.subheader("💬 Faculty Feedback Analysis")
     
-    feedback_summary = filtered_data.groupby('Faculty_Feedback').size().reset_index(name='Count')
+    feedback_summary = filtered_data.groupby('Faculty_Feedback', observed=True).size().reset_index(name='Count')
     
     fig_feedback = px.pie(
         feedback_summary,
@@ -405,9 +405,9 @@ def enhanced_ai_tutor_analysis(data, program_filter=None, cohort_filter=None):
     # Requirement 11: Quiz Analysis (By Faculty, By Cohort)
     st.subheader("🎯 Comprehensive Quiz Analysis")
     
-    quiz_analysis = filtered_data.groupby(['Faculty Name', 'Cohort']).agg({
+    quiz_analysis = filtered_data.groupby(['Faculty Name', 'Cohort'], observed=True).agg({
         'No. of Quizzes_conducted': 'sum',
-        'AI_Quizzes_used_for_grading': lambda x: (x == 'Yes').sum(),
+        'AI_Quizzes_used_for_grading': lambda x: yes_mask(x).sum(),
         'Average Score of AI Tutor Platform Quiz': 'mean'
     }).round(2).reset_index()
     
@@ -452,13 +452,13 @@ def enhanced_ai_mentor_analysis(data):
     st.subheader("👥 Academic Managers Comprehensive Analysis")
     
     # AM Performance Overview
-    am_overview = data.groupby('Academic_Manager_Name').agg({
+    am_overview = data.groupby('Academic_Manager_Name', observed=True).agg({
         'Total Number of students/teams  mentoring/mentored': 'sum',
         'Approx. percentage of students under your guidance who levelled up using AI Mentor.': 'mean',
-        'Q1_Are Students_motivated to use AI Mentor? (Yes/No, as they don\'t find it useful)': lambda x: (x == 'Yes').sum() / len(x) * 100,
-        'Q2_Are students using AI Mentor effectively ? (Yes/No)': lambda x: (x == 'Yes').sum() / len(x) * 100,
-        'Q3_Have you mandated students to meet you only after obtaining suggestions from AI Mentor? (Yes/No)': lambda x: (x == 'Yes').sum() / len(x) * 100,
-        'Q4_Improvement_observed in student\'s logical thinking, Presentation & Report Structure with the use of AI Mentor (Yes/No)': lambda x: (x == 'Yes').sum() / len(x) * 100
+        'Q1_Are Students_motivated to use AI Mentor? (Yes/No, as they don\'t find it useful)': lambda x: yes_mask(x).sum() / len(x) * 100,
+        'Q2_Are students using AI Mentor effectively ? (Yes/No)': lambda x: yes_mask(x).sum() / len(x) * 100,
+        'Q3_Have you mandated students to meet you only after obtaining suggestions from AI Mentor? (Yes/No)': lambda x: yes_mask(x).sum() / len(x) * 100,
+        'Q4_Improvement_observed in student\'s logical thinking, Presentation & Report Structure with the use of AI Mentor (Yes/No)': lambda x: yes_mask(x).sum() / len(x) * 100
     }).round(2).reset_index()
     
     am_overview.columns = [
@@ -499,12 +499,12 @@ def enhanced_ai_mentor_analysis(data):
     # Requirement 14: Project Type Analysis for AM
     st.subheader("📋 Project Type Analysis")
     
-    project_analysis = data.groupby(['Project Type (ARP, IBR 1, IBR 2, Industry Project)', 'Academic_Manager_Name']).agg({
+    project_analysis = data.groupby(['Project Type (ARP, IBR 1, IBR 2, Industry Project)', 'Academic_Manager_Name'], observed=True).agg({
         'Total Number of students/teams  mentoring/mentored': 'sum',
         'Approx. percentage of students under your guidance who levelled up using AI Mentor.': 'mean'
     }).reset_index()
     
-    project_summary = data.groupby('Project Type (ARP, IBR 1, IBR 2, Industry Project)').agg({
+    project_summary = data.groupby('Project Type (ARP, IBR 1, IBR 2, Industry Project)', observed=True).agg({
         'Total Number of students/teams  mentoring/mentored': 'sum',
         'Approx. percentage of students under your guidance who levelled up using AI Mentor.': 'mean'
     }).round(2).reset_index()
@@ -536,7 +536,7 @@ def enhanced_ai_mentor_analysis(data):
     
     # Calculate adoption metrics
     total_ams = data['Academic_Manager_Name'].nunique()
-    active_ams = data[data['Q2_Are students using AI Mentor effectively ? (Yes/No)'] == 'Yes']['Academic_Manager_Name'].nunique()
+    active_ams = data[yes_mask(data['Q2_Are students using AI Mentor effectively ? (Yes/No)'])]['Academic_Manager_Name'].nunique()
     adoption_rate = (active_ams / total_ams) * 100 if total_ams > 0 else 0
     
     col1, col2, col3 = st.columns(3)
@@ -648,7 +648,7 @@ def ai_tkt_analysis(data):
     
     with col1:
         # Subject-wise improvement
-        subject_improvement = data.groupby('Unit').agg({
+        subject_improvement = data.groupby('Unit', observed=True).agg({
             'Average Grades Before AI for TKT': 'mean',
             'Avergae Grades After AI for TKT': 'mean',
             'Improvement%': 'mean'
@@ -742,7 +742,7 @@ def cr_analysis(data):
     col1, col2 = st.columns(2)
     
     with col1:
-        industry_analysis = data.groupby('Industry_Sector').agg({
+        industry_analysis = data.groupby('Industry_Sector', observed=True).agg({
             'Students_Selected': 'sum',
             'Avg_CTC(in USD)': 'mean'
         }).reset_index()
@@ -760,7 +760,7 @@ def cr_analysis(data):
     
     with col2:
         # Company Tier Analysis
-        tier_analysis = data.groupby('Company_Tier').agg({
+        tier_analysis = data.groupby('Company_Tier', observed=True).agg({
             'Students_Selected': 'sum',
             'Avg_CTC(in USD)': 'mean'
         }).reset_index()
@@ -826,7 +826,7 @@ def prp_analysis(data):
     
     with col1:
         # Category Analysis
-        category_analysis = data.groupby('Categorise student overall (Outstanding, Good, Average, Needs Handholding)').size().reset_index(name='Count')
+        category_analysis = data.groupby('Categorise student overall (Outstanding, Good, Average, Needs Handholding)', observed=True).size().reset_index(name='Count')
         
         fig_category = px.pie(
             category_analysis,
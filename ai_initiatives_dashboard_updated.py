@@ -6,8 +6,9 @@ import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import warnings
 warnings.filterwarnings('ignore')
-from data_manager import DataManager
+from data_manager import DataManager, yes_mask
 import os
+from datetime import datetime
 
 # Page configuration
 st.set_page_config(
@@ -49,23 +50,11 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-@st.cache_data
-def load_data():
-    """Load all the data files"""
-    try:
-        data_manager = DataManager()
-        data = {}
-        
-        for data_type, filename in data_manager.data_files.items():
-            if os.path.exists(filename):
-                data[data_type] = pd.read_csv(filename)
-            else:
-                data[data_type] = pd.DataFrame()
-        
-        return data
-    except Exception as e:
-        st.error(f"Error loading data: {e}")
-        return {}
+def yes_count(cube, data, column):
+    """Yes answers in a Yes/No column: summed from the cube, or counted from the rows if the column was kept as text"""
+    if column in cube.measures:
+        return cube.sum(column)
+    return int(yes_mask(data[column]).sum())
 
 def calculate_conversion_rate(selected, applied):
     """Calculate conversion rate with error handling"""
@@ -123,6 +112,14 @@ def data_management_page():
                 mime='application/zip'
             )
             
+            # One sheet per template, for uploading every dataset in a single workbook
+            st.download_button(
+                label="📚 Download All Templates (Workbook)",
+                data=data_manager.download_workbook_template(),
+                file_name="ai_initiatives_templates.xlsx",
+                mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+            )
+            
             st.info("""
             **Instructions:**
             1. Download the template(s) you need
@@ -154,14 +151,17 @@ def data_management_page():
         # File upload
         uploaded_file = st.file_uploader(
             f"Upload {data_type} Data",
-            type=['csv'],
-            help=f"Upload CSV file with {data_type} data"
+            type=['csv', 'xlsx'],
+            help=f"Upload a CSV file or Excel workbook with {data_type} data"
         )
         
         if uploaded_file is not None:
             try:
-                # Read uploaded file
-                uploaded_df = pd.read_csv(uploaded_file)
+                # Read uploaded file; workbooks are read directly, without converting to CSV first
+                if uploaded_file.name.lower().endswith('.xlsx'):
+                    uploaded_df = pd.read_excel(uploaded_file).dropna(how='all')
+                else:
+                    uploaded_df = pd.read_csv(uploaded_file)
                 
                 st.write("**Preview of uploaded data:**")
                 st.dataframe(uploaded_df.head())
@@ -172,17 +172,29 @@ def data_management_page():
                 if is_valid:
                     st.success(f"✅ {message}")
                     
-                    # Load existing data
-                    existing_df = data_manager.load_existing_data(data_type)
+                    # Row count from the catalog, so no stored data is read on each rerun
+                    catalog_entry = data_manager.get_catalog(data_type)
                     
-                    st.write(f"**Current data:** {len(existing_df)} records")
+                    st.write(f"**Current data:** {catalog_entry['records'] if catalog_entry else 0} records")
                     st.write(f"**New data:** {len(uploaded_df)} records")
                     
-                    # Operation selection
+                    # Preview merge deduplication against the stored row-hash index
+                    duplicates = data_manager.count_duplicates(uploaded_df, data_type)
+                    st.write(f"**Duplicates:** {duplicates['already_stored']} already stored, "
+                             f"{duplicates['within_upload']} repeated within the upload "
+                             f"({duplicates['new']} new records would be merged)")
+                    
+                    # Operation selection; upsert is offered for templates with a natural key
+                    operations = ["Merge with existing data", "Replace all existing data"]
+                    key_columns = data_manager.get_template_info(data_type)['key']
+                    if key_columns:
+                        operations.insert(1, "Upsert by key (update matching records)")
                     operation = st.radio(
                         "Choose operation:",
-                        ["Merge with existing data", "Replace all existing data"],
-                        help="Merge: Add new data to existing data. Replace: Delete all existing data and use only new data."
+                        operations,
+                        help="Merge: Add new data to existing data. Upsert: Overwrite records whose key "
+                             f"({', '.join(key_columns) or 'none'}) already exists and add the rest. "
+                             "Replace: Delete all existing data and use only new data."
                     )
                     
                     col1, col2 = st.columns(2)
@@ -190,20 +202,24 @@ def data_management_page():
                     with col1:
                         if st.button("🚀 Execute Upload", type="primary"):
                             if operation == "Merge with existing data":
-                                result_df, success, msg = data_manager.merge_data(existing_df, uploaded_df, data_type, user_info)
+                                # Only new rows are appended; existing data is not rewritten
+                                result_df, success, msg = data_manager.append_data(uploaded_df, data_type, user_info)
+                                save_success, save_msg = success, "New records appended to storage"
+                            elif operation.startswith("Upsert"):
+                                # Matching records are overwritten in place; the data is saved by upsert_data
+                                result_df, success, msg = data_manager.upsert_data(uploaded_df, data_type, user_info)
+                                save_success, save_msg = success, "Records upserted to storage"
                             else:
                                 result_df, success, msg = data_manager.replace_data(uploaded_df, data_type, user_info)
+                                if success:
+                                    # Save the data
+                                    save_success, save_msg = data_manager.save_data(result_df, data_type, user_info, "REPLACE")
                             
                             if success:
-                                # Save the data
-                                save_success, save_msg = data_manager.save_data(result_df, data_type)
                                 if save_success:
                                     st.success(f"✅ {msg}")
                                     st.success(f"✅ {save_msg}")
                                     st.balloons()
-                                    
-                                    # Clear cache to reload data
-                                    st.cache_data.clear()
                                 else:
                                     st.error(f"❌ {save_msg}")
                             else:
@@ -215,7 +231,6 @@ def data_management_page():
                                 success, msg = data_manager.delete_data(data_type, user_info)
                                 if success:
                                     st.success(f"✅ {msg}")
-                                    st.cache_data.clear()
                                 else:
                                     st.error(f"❌ {msg}")
                 
@@ -227,6 +242,46 @@ def data_management_page():
                     
             except Exception as e:
                 st.error(f"❌ Error reading uploaded file: {e}")
+        
+        # All datasets at once: a workbook with one sheet per template, or a ZIP of template CSVs
+        st.markdown("---")
+        st.write("**📚 Upload All Datasets at Once**")
+        workbook_file = st.file_uploader(
+            "Upload Combined Workbook or ZIP",
+            type=['xlsx', 'zip'],
+            key="workbook_upload",
+            help="A workbook with one sheet per template, or a ZIP of template CSVs "
+                 "laid out like 'Download All Templates (ZIP)'"
+        )
+        
+        if workbook_file is not None:
+            workbook_operation = st.radio(
+                "Choose operation for every dataset:",
+                ["Merge with existing data", "Replace all existing data"],
+                key="workbook_operation"
+            )
+            if st.button("🚀 Ingest All", type="primary", key="ingest_workbook"):
+                mode = "merge" if workbook_operation.startswith("Merge") else "replace"
+                if workbook_file.name.lower().endswith('.zip'):
+                    # Files are processed in parallel; one progress bar for the whole archive
+                    progress_bar = st.progress(0.0, text="Ingesting ZIP...")
+                    success, msg, results = data_manager.ingest_zip(
+                        workbook_file, user_info, mode,
+                        progress=lambda done, total, name: progress_bar.progress(done / total, text=f"{done}/{total} done ({name})")
+                    )
+                else:
+                    with st.spinner("Ingesting workbook..."):
+                        success, msg, results = data_manager.ingest_workbook(workbook_file, user_info, mode)
+                
+                for sheet_type, (sheet_success, sheet_msg) in results.items():
+                    if sheet_success:
+                        st.success(f"✅ {sheet_type}: {sheet_msg}")
+                    else:
+                        st.error(f"❌ {sheet_type}: {sheet_msg}")
+                if success:
+                    st.success(f"✅ {msg}")
+                else:
+                    st.error(f"❌ {msg}")
     
     with tab3:
         st.subheader("🗂️ Data Summary")
@@ -248,12 +303,23 @@ def data_management_page():
                     📊 Records: {info['records']:,}
                     📅 Last Modified: {info['last_modified']}
                     💾 File Size: {info['file_size']}
+                    👤 Last Writer: {info.get('last_writer', 'N/A')}
                     📝 Description: {info.get('description', 'N/A')}
                     """)
+                    st.download_button(
+                        label=f"📄 Export {data_type} (CSV)",
+                        data=data_manager.export_data(data_type),
+                        file_name=data_manager.data_files[data_type],
+                        mime='text/csv',
+                        key=f"export_{data_type.replace(' ', '_')}"
+                    )
+                    versions = data_manager.list_versions(data_type)
+                    if len(versions) > 1:
+                        with st.expander(f"🕰️ Version history ({len(versions)} versions)"):
+                            st.dataframe(pd.DataFrame(versions[::-1]), use_container_width=True)
         
         # Refresh button
         if st.button("🔄 Refresh Summary"):
-            st.cache_data.clear()
             st.experimental_rerun()
     
     with tab4:
@@ -294,36 +360,37 @@ def data_management_page():
                 mime='text/plain'
             )
 
-def ai_tkt_analysis(data):
+def ai_tkt_analysis(data, cubes):
     """AI TKT (Technical Knowledge Test) Analysis Section"""
     st.markdown('<h2 class="section-header">🧠 AI TKT (Technical Knowledge Test) Analysis</h2>', unsafe_allow_html=True)
     
     ai_tkt_data = data.get('AI TKT', pd.DataFrame())
+    ai_tkt_cube = cubes['AI TKT']
     
     if ai_tkt_data.empty:
         st.warning("No AI TKT data available. Please upload data using the Data Management page.")
         return
     
-    # Key metrics
+    # Key metrics (rolled up from the pre-aggregated cube)
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
-        total_tests = len(ai_tkt_data)
+        total_tests = ai_tkt_cube.count()
         st.metric("Total Tests Conducted", f"{total_tests:,}")
     
     with col2:
         if 'Average Grades Before AI for TKT' in ai_tkt_data.columns:
-            avg_before = ai_tkt_data['Average Grades Before AI for TKT'].mean()
+            avg_before = ai_tkt_cube.mean('Average Grades Before AI for TKT')
             st.metric("Average Before Score", f"{avg_before:.1f}")
     
     with col3:
         if 'Avergae Grades After AI for TKT' in ai_tkt_data.columns:
-            avg_after = ai_tkt_data['Avergae Grades After AI for TKT'].mean()
+            avg_after = ai_tkt_cube.mean('Avergae Grades After AI for TKT')
             st.metric("Average After Score", f"{avg_after:.1f}")
     
     with col4:
         if 'Improvement%' in ai_tkt_data.columns:
-            avg_improvement = ai_tkt_data['Improvement%'].mean()
+            avg_improvement = ai_tkt_cube.mean('Improvement%')
             st.metric("Average Improvement", f"{avg_improvement:.1f}%")
     
     # Before/After Analysis
@@ -343,7 +410,7 @@ def ai_tkt_analysis(data):
             if 'Unit' in ai_tkt_data.columns and 'Course' in ai_tkt_data.columns:
                 improvement_data = ai_tkt_data.copy()
                 
-                unit_improvement = improvement_data.groupby(['Course', 'Unit'])['Improvement%'].mean().reset_index()
+                unit_improvement = improvement_data.groupby(['Course', 'Unit'], observed=True)['Improvement%'].mean().reset_index()
                 
                 fig = px.bar(unit_improvement, x='Unit', y='Improvement%', color='Course',
                             title='Average Improvement by Unit and Course',
@@ -351,11 +418,12 @@ def ai_tkt_analysis(data):
                 fig.update_layout(xaxis_tickangle=-45)
                 st.plotly_chart(fig, use_container_width=True)
 
-def cr_analysis(data):
+def cr_analysis(data, cubes):
     """Corporate Relations Analysis Section"""
     st.markdown('<h2 class="section-header">🏢 Corporate Relations (CR) Analysis</h2>', unsafe_allow_html=True)
     
     cr_data = data.get('CR (Corporate Relations)', pd.DataFrame())
+    cr_cube = cubes['CR (Corporate Relations)']
     
     if cr_data.empty:
         st.warning("No Corporate Relations data available. Please upload data using the Data Management page.")
@@ -369,16 +437,18 @@ def cr_analysis(data):
         st.metric("Total Companies Engaged", f"{total_companies:,}")
     
     with col2:
-        total_placements = cr_data['Students_Selected'].sum() if 'Students_Selected' in cr_data.columns else 0
+        total_placements = cr_cube.sum('Students_Selected') if 'Students_Selected' in cr_data.columns else 0
         st.metric("Total Students Placed", f"{total_placements:,}")
     
     with col3:
-        avg_ctc = cr_data['Avg_CTC(in USD)'].mean() if 'Avg_CTC(in USD)' in cr_data.columns else 0
+        avg_ctc = cr_cube.mean('Avg_CTC(in USD)') if 'Avg_CTC(in USD)' in cr_data.columns else 0
         st.metric("Average CTC", f"${avg_ctc:,.0f}")
     
     with col4:
         if 'Year' in cr_data.columns:
-            current_year_placements = cr_data[cr_data['Year'] == cr_data['Year'].max()]['Students_Selected'].sum() if 'Students_Selected' in cr_data.columns else 0
+            # Placements per year are sorted by year, so the last one is the current year
+            placements_by_year = cr_cube.sum('Students_Selected', by='year') if 'Students_Selected' in cr_data.columns else pd.Series(dtype='int64')
+            current_year_placements = placements_by_year.iloc[-1] if len(placements_by_year) else 0
             st.metric("Current Year Placements", f"{current_year_placements:,}")
     
     # Analysis charts
@@ -387,7 +457,7 @@ def cr_analysis(data):
     with col1:
         # Placements by industry
         if 'Industry_Sector' in cr_data.columns and 'Students_Selected' in cr_data.columns:
-            industry_placements = cr_data.groupby('Industry_Sector')['Students_Selected'].sum().reset_index()
+            industry_placements = cr_data.groupby('Industry_Sector', observed=True)['Students_Selected'].sum().reset_index()
             fig = px.pie(industry_placements, values='Students_Selected', names='Industry_Sector',
                         title='Placements by Industry Sector')
             st.plotly_chart(fig, use_container_width=True)
@@ -399,11 +469,12 @@ def cr_analysis(data):
                               labels={'Avg_CTC(in USD)': 'Average CTC (USD)', 'count': 'Number of Companies'})
             st.plotly_chart(fig, use_container_width=True)
 
-def prp_analysis(data):
+def prp_analysis(data, cubes):
     """Placement Readiness Program Analysis Section"""
     st.markdown('<h2 class="section-header">🎯 Placement Readiness Program (PRP) Analysis</h2>', unsafe_allow_html=True)
     
     prp_data = data.get('PRP (Placement Readiness Program)', pd.DataFrame())
+    prp_cube = cubes['PRP (Placement Readiness Program)']
     
     if prp_data.empty:
         st.warning("No PRP data available. Please upload data using the Data Management page.")
@@ -413,7 +484,7 @@ def prp_analysis(data):
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
-        total_students = len(prp_data)
+        total_students = prp_cube.count()
         st.metric("Total Students Evaluated", f"{total_students:,}")
     
     with col2:
@@ -426,12 +497,12 @@ def prp_analysis(data):
     
     with col3:
         if 'No. of JPT Mock Interviews attempted and scored equal or above 80%' in prp_data.columns:
-            avg_jpt = prp_data['No. of JPT Mock Interviews attempted and scored equal or above 80%'].mean()
+            avg_jpt = prp_cube.mean('No. of JPT Mock Interviews attempted and scored equal or above 80%')
             st.metric("Average JPT High Scores", f"{avg_jpt:.1f}")
     
     with col4:
         if 'Area Head Mock Interview Score' in prp_data.columns:
-            avg_mock = prp_data['Area Head Mock Interview Score'].mean()
+            avg_mock = prp_cube.mean('Area Head Mock Interview Score')
             st.metric("Average Mock Interview Score", f"{avg_mock:.1f}")
     
     # Analysis charts
@@ -452,39 +523,40 @@ def prp_analysis(data):
                         title='Placement Status Distribution')
             st.plotly_chart(fig, use_container_width=True)
 
-def enhanced_ai_tutor_analysis(data):
+def enhanced_ai_tutor_analysis(data, cubes):
     """Enhanced AI Tutor Analysis with new features"""
     st.markdown('<h2 class="section-header">📚 Enhanced AI Tutor Analysis</h2>', unsafe_allow_html=True)
     
     ai_tutor_data = data.get('AI Tutor', pd.DataFrame())
+    ai_tutor_cube = cubes['AI Tutor']
     
     if ai_tutor_data.empty:
         st.warning("No AI Tutor data available. Please upload data using the Data Management page.")
         return
     
-    # Key metrics
+    # Key metrics (rolled up from the pre-aggregated cube)
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
         if 'Total_Students_Participated_watched videos' in ai_tutor_data.columns and 'Batch_size(number should come from student feedback form)' in ai_tutor_data.columns:
-            total_participated = ai_tutor_data['Total_Students_Participated_watched videos'].sum()
-            total_batch = ai_tutor_data['Batch_size(number should come from student feedback form)'].sum()
+            total_participated = ai_tutor_cube.sum('Total_Students_Participated_watched videos')
+            total_batch = ai_tutor_cube.sum('Batch_size(number should come from student feedback form)')
             adoption_rate = (total_participated / total_batch * 100) if total_batch > 0 else 0
             st.metric("Overall Adoption Rate", f"{adoption_rate:.1f}%")
     
     with col2:
         if 'Avg_Rating_for_AI_Tutor_Tool' in ai_tutor_data.columns:
-            avg_rating = ai_tutor_data['Avg_Rating_for_AI_Tutor_Tool'].mean()
+            avg_rating = ai_tutor_cube.mean('Avg_Rating_for_AI_Tutor_Tool')
             st.metric("Avg AI Tutor Rating", f"{avg_rating:.2f}/5.0")
     
     with col3:
         if 'No_of_Session_IDs_created' in ai_tutor_data.columns:
-            total_sessions = ai_tutor_data['No_of_Session_IDs_created'].sum()
+            total_sessions = ai_tutor_cube.sum('No_of_Session_IDs_created')
             st.metric("Total Sessions Created", f"{total_sessions:,}")
     
     with col4:
         if 'Total_Students_Participated_watched videos' in ai_tutor_data.columns:
-            total_participants = ai_tutor_data['Total_Students_Participated_watched videos'].sum()
+            total_participants = ai_tutor_cube.sum('Total_Students_Participated_watched videos')
             st.metric("Total Students Participated", f"{total_participants:,}")
     
     # Campus-wise analysis (including SYD)
@@ -493,10 +565,10 @@ def enhanced_ai_tutor_analysis(data):
         
         with col1:
             # Calculate adoption rate by campus
-            campus_data = ai_tutor_data.groupby('Campus (SG/MUM/SYD/DXB)').agg({
-                'Total_Students_Participated_watched videos': 'sum',
-                'Batch_size(number should come from student feedback form)': 'sum'
-            }).reset_index()
+            campus_data = ai_tutor_cube.sum([
+                'Total_Students_Participated_watched videos',
+                'Batch_size(number should come from student feedback form)'
+            ], by='campus').rename_axis('Campus (SG/MUM/SYD/DXB)').reset_index()
             campus_data['Adoption_Rate'] = (campus_data['Total_Students_Participated_watched videos'] / 
                                           campus_data['Batch_size(number should come from student feedback form)'] * 100)
             
@@ -508,17 +580,18 @@ def enhanced_ai_tutor_analysis(data):
         with col2:
             # Rating by campus
             if 'Avg_Rating_for_AI_Tutor_Tool' in ai_tutor_data.columns:
-                campus_rating = ai_tutor_data.groupby('Campus (SG/MUM/SYD/DXB)')['Avg_Rating_for_AI_Tutor_Tool'].mean().reset_index()
+                campus_rating = ai_tutor_cube.mean('Avg_Rating_for_AI_Tutor_Tool', by='campus').rename_axis('Campus (SG/MUM/SYD/DXB)').reset_index()
                 fig = px.bar(campus_rating, x='Campus (SG/MUM/SYD/DXB)', y='Avg_Rating_for_AI_Tutor_Tool',
                             title='AI Tutor Rating by Campus',
                             labels={'Avg_Rating_for_AI_Tutor_Tool': 'Average Rating'})
                 st.plotly_chart(fig, use_container_width=True)
 
-def enhanced_unit_performance_analysis(data):
+def enhanced_unit_performance_analysis(data, cubes):
     """Enhanced Unit Performance Analysis with AI Tutor effectiveness"""
     st.markdown('<h2 class="section-header">📈 Enhanced Unit Performance Analysis</h2>', unsafe_allow_html=True)
     
     unit_data = data.get('Unit Performance', pd.DataFrame())
+    unit_cube = cubes['Unit Performance']
     
     if unit_data.empty:
         st.warning("No Unit Performance data available. Please upload data using the Data Management page.")
@@ -533,7 +606,7 @@ def enhanced_unit_performance_analysis(data):
     
     with col2:
         if 'Total_Avg_score' in unit_data.columns:
-            avg_score = unit_data['Total_Avg_score'].mean()
+            avg_score = unit_cube.mean('Total_Avg_score')
             st.metric("Average Unit Score", f"{avg_score:.1f}")
     
     with col3:
@@ -566,7 +639,7 @@ def enhanced_unit_performance_analysis(data):
         with col2:
             # Program-wise analysis
             if 'Course' in unit_data.columns:
-                program_analysis = unit_data.groupby(['Course', 'AI Tutor (Before/After)'])['Total_Avg_score'].mean().reset_index()
+                program_analysis = unit_data.groupby(['Course', 'AI Tutor (Before/After)'], observed=True)['Total_Avg_score'].mean().reset_index()
                 fig = px.bar(program_analysis, x='Course', y='Total_Avg_score', color='AI Tutor (Before/After)',
                             title='Average Unit Scores by Program and AI Tutor Status',
                             labels={'Total_Avg_score': 'Average Score'})
@@ -588,40 +661,27 @@ def main():
     st.markdown('<h1 class="main-header">🚀 AI Initiatives Impact Dashboard</h1>', unsafe_allow_html=True)
     st.markdown("### SP Jain School of Global Management - MGB, GMBA & GCGM Programs")
     
-    # Load data
-    data = load_data()
+    data_manager = DataManager()
+    
+    # Time travel: show the data as it stood at the end of a chosen day
+    as_of = None
+    if st.sidebar.checkbox("🕰️ View historical data", help="Show every dataset as it was at the end of the chosen date"):
+        as_of_date = st.sidebar.date_input("Data as of", value=datetime.now().date())
+        as_of = datetime.combine(as_of_date, datetime.max.time())
     
-    if not data:
+    # Check that data exists from the catalog; tabs read rows through query_data and the cubes
+    if as_of is None and not any(data_manager.get_catalog(data_type) for data_type in data_manager.data_files):
         st.error("Failed to load data. Please check if all CSV files are present.")
         return
     
     # Sidebar for filters
     st.sidebar.header("📊 Dashboard Filters")
     
-    # Get unique values for filtering
-    all_years = []
-    all_programs = []
-    all_campuses = []
-    
-    for df in data.values():
-        if not df.empty:
-            if 'Year' in df.columns:
-                all_years.extend(df['Year'].unique())
-            if 'Program' in df.columns:
-                all_programs.extend(df['Program'].unique())
-            elif 'Course' in df.columns:
-                all_programs.extend(df['Course'].unique())
-            elif 'Course(GCGM/MGM/GMBA)' in df.columns:
-                all_programs.extend(df['Course(GCGM/MGM/GMBA)'].unique())
-            if 'Campus' in df.columns:
-                all_campuses.extend(df['Campus'].unique())
-            elif 'Campus (SG/MUM/SYD/DXB)' in df.columns:
-                all_campuses.extend(df['Campus (SG/MUM/SYD/DXB)'].unique())
-    
-    # Remove duplicates and sort
-    years = sorted(list(set(all_years))) if all_years else [2022, 2023, 2024]
-    programs = sorted(list(set(all_programs))) if all_programs else ['MGB', 'GMBA', 'GCGM']
-    campuses = sorted(list(set(all_campuses))) if all_campuses else ['SG', 'DXB', 'MUM', 'SYD']
+    # Filter options come from the cached dimension dictionary, without reading any rows
+    filter_options = data_manager.filter_options(as_of)
+    years = filter_options.get('year') or [2022, 2023, 2024]
+    programs = filter_options.get('program') or ['MGB', 'GMBA', 'GCGM']
+    campuses = filter_options.get('campus') or ['SG', 'DXB', 'MUM', 'SYD']
     
     # Year filter
     with st.sidebar.container():
@@ -680,78 +740,68 @@ def main():
         st.experimental_rerun()
     
     # Apply filters to data
-    filtered_data = {}
-    for data_type, df in data.items():
-        if df.empty:
-            filtered_data[data_type] = df
-            continue
-            
-        filtered_df = df.copy()
-        
-        # Apply year filter
-        if selected_years and 'Year' in filtered_df.columns:
-            filtered_df = filtered_df[filtered_df['Year'].isin(selected_years)]
-        
-        # Apply program filter
-        if selected_programs:
-            if 'Program' in filtered_df.columns:
-                filtered_df = filtered_df[filtered_df['Program'].isin(selected_programs)]
-            elif 'Course' in filtered_df.columns:
-                filtered_df = filtered_df[filtered_df['Course'].isin(selected_programs)]
-            elif 'Course(GCGM/MGM/GMBA)' in filtered_df.columns:
-                filtered_df = filtered_df[filtered_df['Course(GCGM/MGM/GMBA)'].isin(selected_programs)]
-        
-        # Apply campus filter
-        if selected_campuses:
-            if 'Campus' in filtered_df.columns:
-                filtered_df = filtered_df[filtered_df['Campus'].isin(selected_campuses)]
-            elif 'Campus (SG/MUM/SYD/DXB)' in filtered_df.columns:
-                filtered_df = filtered_df[filtered_df['Campus (SG/MUM/SYD/DXB)'].isin(selected_campuses)]
-        
-        filtered_data[data_type] = filtered_df
+    filtered_data = {
+        data_type: data_manager.query_data(data_type, selected_years, selected_programs, selected_campuses, as_of)
+        for data_type in data_manager.data_files
+    }
+    
+    # Pre-aggregated cubes answer KPI cards and dimension-level charts without scanning rows
+    cubes = {
+        data_type: data_manager.cube(data_type, as_of).slice(selected_years, selected_programs, selected_campuses)
+        for data_type in data_manager.data_files
+    }
+    
+    # Filtered-view cache: repeat filter selections are served from memory
+    with st.sidebar.expander("⚡ Filter Cache Stats"):
+        cache_stats = data_manager.filtered_view_stats()
+        st.write(f"📦 Views cached: {cache_stats['entries']}")
+        st.write(f"💾 Memory: {cache_stats['bytes'] / 1024 / 1024:.1f} MB of {cache_stats['max_bytes'] / 1024 / 1024:.0f} MB")
+        st.write(f"🎯 Hit rate: {cache_stats['hit_rate']:.0%} ({cache_stats['hits']} hits, {cache_stats['misses']} misses)")
+        st.write(f"♻️ Evicted: {cache_stats['evictions']} (memory cap), {cache_stats['invalidations']} (data changed)")
     
     # Display analysis sections based on selected tools
     if "All Tools" in selected_tools or "AI Tutor" in selected_tools:
-        enhanced_ai_tutor_analysis(filtered_data)
+        enhanced_ai_tutor_analysis(filtered_data, cubes)
     
     if "All Tools" in selected_tools or "AI Mentor" in selected_tools:
         # AI Mentor analysis
         st.markdown('<h2 class="section-header">🤖 AI Mentor Impact Analysis</h2>', unsafe_allow_html=True)
         
         ai_mentor_data = filtered_data.get('AI Mentor', pd.DataFrame())
+        ai_mentor_cube = cubes['AI Mentor']
         if not ai_mentor_data.empty:
             col1, col2, col3, col4 = st.columns(4)
             
             with col1:
-                total_managers = len(ai_mentor_data)
+                total_managers = ai_mentor_cube.count()
                 st.metric("Total Academic Managers", total_managers)
             
             with col2:
                 if "Q1_Are Students_motivated to use AI Mentor? (Yes/No, as they don't find it useful)" in ai_mentor_data.columns:
-                    motivation_rate = (ai_mentor_data["Q1_Are Students_motivated to use AI Mentor? (Yes/No, as they don't find it useful)"] == 'Yes').sum() / len(ai_mentor_data) * 100
+                    motivation_rate = yes_count(ai_mentor_cube, ai_mentor_data, "Q1_Are Students_motivated to use AI Mentor? (Yes/No, as they don't find it useful)") / total_managers * 100
                     st.metric("Student Motivation Rate", f"{motivation_rate:.1f}%")
             
             with col3:
                 if "Q2_Are students using AI Mentor effectively ? (Yes/No)" in ai_mentor_data.columns:
-                    effectiveness_rate = (ai_mentor_data["Q2_Are students using AI Mentor effectively ? (Yes/No)"] == 'Yes').sum() / len(ai_mentor_data) * 100
+                    effectiveness_rate = yes_count(ai_mentor_cube, ai_mentor_data, "Q2_Are students using AI Mentor effectively ? (Yes/No)") / total_managers * 100
                     st.metric("Effectiveness Rate", f"{effectiveness_rate:.1f}%")
             
             with col4:
                 if "Q4_Improvement_observed in student's logical thinking, Presentation & Report Structure with the use of AI Mentor (Yes/No)" in ai_mentor_data.columns:
-                    improvement_rate = (ai_mentor_data["Q4_Improvement_observed in student's logical thinking, Presentation & Report Structure with the use of AI Mentor (Yes/No)"] == 'Yes').sum() / len(ai_mentor_data) * 100
+                    improvement_rate = yes_count(ai_mentor_cube, ai_mentor_data, "Q4_Improvement_observed in student's logical thinking, Presentation & Report Structure with the use of AI Mentor (Yes/No)") / total_managers * 100
                     st.metric("Improvement Observed Rate", f"{improvement_rate:.1f}%")
     
     if "All Tools" in selected_tools or "AI TKT" in selected_tools:
-        ai_tkt_analysis(filtered_data)
+        ai_tkt_analysis(filtered_data, cubes)
     
     if "All Tools" in selected_tools or "CR" in selected_tools:
-        cr_analysis(filtered_data)
+        cr_analysis(filtered_data, cubes)
     
     if "All Tools" in selected_tools or "PRP" in selected_tools:
-        prp_analysis(filtered_data)
+        prp_analysis(filtered_data, cubes)
     
     if "All Tools" in selected_tools or "Unit Performance" in selected_tools:
-        enhanced_unit_performance_analysis(filtered_data)
+        enhanced_unit_performance_analysis(filtered_data, cubes)
     
     # Overall AI Impact Analysis
     st.markdown('<h2 class="section-header">🎯 Overall AI Initiatives Impact</h2>', unsafe_allow_html=True)
@@ -763,7 +813,7 @@ def main():
         with col1:
             # AI tool usage impact on placement
             if 'AI Tutor Usage' in ai_impact_data.columns and 'Placed/Not Placed' in ai_impact_data.columns:
-                placement_by_ai_usage = ai_impact_data.groupby(['AI Tutor Usage', 'Placed/Not Placed']).size().unstack(fill_value=0)
+                placement_by_ai_usage = ai_impact_data.groupby(['AI Tutor Usage', 'Placed/Not Placed'], observed=False).size().unstack(fill_value=0)
                 placement_by_ai_usage['Total'] = placement_by_ai_usage.sum(axis=1)
                 placement_by_ai_usage['Placement_Rate'] = (placement_by_ai_usage['Placed'] / placement_by_ai_usage['Total'] * 100).round(1)
                 
@@ -776,7 +826,7 @@ def main():
         with col2:
             # CGPA vs AI tool usage
             if 'AI Tutor Usage' in ai_impact_data.columns and 'CGPA' in ai_impact_data.columns:
-                cgpa_by_ai_usage = ai_impact_data.groupby('AI Tutor Usage')['CGPA'].mean().reset_index()
+                cgpa_by_ai_usage = ai_impact_data.groupby('AI Tutor Usage', observed=True)['CGPA'].mean().reset_index()
                 fig = px.bar(cgpa_by_ai_usage, x='AI Tutor Usage', y='CGPA',
                             title='Average CGPA by AI Tutor Usage Level',
                             labels={'CGPA': 'Average CGPA'})
@@ -789,15 +839,15 @@ def main():
     col1, col2, col3 = st.columns(3)
     
     with col1:
-        total_records = sum(len(df) for df in filtered_data.values() if not df.empty)
+        total_records = sum(cube.count() for cube in cubes.values())
         st.metric("Total Records Analyzed", f"{total_records:,}")
     
     with col2:
-        ai_tutor_records = len(filtered_data.get('AI Tutor', pd.DataFrame()))
+        ai_tutor_records = cubes['AI Tutor'].count()
         st.metric("AI Tutor Records", f"{ai_tutor_records:,}")
     
     with col3:
-        cr_records = len(filtered_data.get('CR (Corporate Relations)', pd.DataFrame()))
+        cr_records = cubes['CR (Corporate Relations)'].count()
         st.metric("CR Placement Records", f"{cr_records:,}")
     
     # Footer
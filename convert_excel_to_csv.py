@@ -1,20 +1,151 @@
 import pandas as pd
 import os
+import sys
+import json
+import hashlib
+import time
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from data_manager import DATA_STORE_DIR, DataManager
 
-def convert_excel_to_csv():
-    """Convert all updated Excel templates to CSV format for analysis"""
-    
-    # Updated Excel templates in the main folder
-    excel_templates = {
-        'AI Tutor': 'ai_tutor template updated.xlsx',
-        'AI Mentor': 'ai_mentor_template - updated.xlsx', 
-        'AI Impact': 'AI-initiatives impact updated.xlsx',
-        'AI TKT': 'AI_ TKT _ Template updated.xlsx',
-        'Unit Performance': 'unit_performance_template -updated.xlsx',
-        'CR (Corporate Relations)': 'CR_template -updated.xlsx',
-        'PRP (Placement Readiness Program)': 'PRP_template - updated.xlsx'
+# Updated Excel templates in the main folder
+EXCEL_TEMPLATES = {
+    'AI Tutor': 'ai_tutor template updated.xlsx',
+    'AI Mentor': 'ai_mentor_template - updated.xlsx',
+    'AI Impact': 'AI-initiatives impact updated.xlsx',
+    'AI TKT': 'AI_ TKT _ Template updated.xlsx',
+    'Unit Performance': 'unit_performance_template -updated.xlsx',
+    'CR (Corporate Relations)': 'CR_template -updated.xlsx',
+    'PRP (Placement Readiness Program)': 'PRP_template - updated.xlsx'
+}
+
+# Per workbook: its current content hash (sha256), plus the hash it had at the last successful
+# CSV conversion (csv_sha256) and at the last successful ingest into native storage (ingested_sha256)
+CONVERSION_MANIFEST = os.path.join(DATA_STORE_DIR, 'excel_conversion_manifest.json')
+
+# Upper bound on worker processes converting workbooks in parallel
+MAX_CONVERT_WORKERS = 4
+
+def load_manifest():
+    """Read the conversion manifest, or an empty one if it is missing or unreadable"""
+    try:
+        with open(CONVERSION_MANIFEST, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_manifest(manifest):
+    """Write the conversion manifest atomically"""
+    os.makedirs(os.path.dirname(CONVERSION_MANIFEST) or '.', exist_ok=True)
+    tmp_path = CONVERSION_MANIFEST + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, CONVERSION_MANIFEST)
+
+def file_sha256(path):
+    """SHA-256 of a file's content, read in 1 MB chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def workbook_state(excel_file, known):
+    """Current (mtime, size, hash) of a workbook; the hash is reused while mtime and size are unchanged"""
+    stat = os.stat(excel_file)
+    if known and (known['mtime_ns'], known['size']) == (stat.st_mtime_ns, stat.st_size):
+        content_hash = known['sha256']
+    else:
+        content_hash = file_sha256(excel_file)
+    return {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'sha256': content_hash}
+
+def convert_workbook(excel_file):
+    """Convert one workbook to CSV (runs in a worker process)"""
+    started = time.perf_counter()
+    df = pd.read_excel(excel_file)
+    csv_filename = excel_file.replace('.xlsx', '.csv')
+    df.to_csv(csv_filename, index=False)
+    return {
+        'csv_file': csv_filename,
+        'shape': df.shape,
+        'columns': list(df.columns),
+        'sample': df.head(2).to_string(index=False) if not df.empty else None,
+        'seconds': time.perf_counter() - started
     }
+
+def ingest_workbook(template_name, excel_file):
+    """Stream one workbook into native storage (runs in a worker process; writes are lock-protected)"""
+    started = time.perf_counter()
+    success, message = DataManager().ingest_excel(excel_file, template_name, f"Excel ingest ({excel_file})")
+    return success, message, time.perf_counter() - started
+
+def ingest_excel_templates(force=False):
+    """Write changed workbooks straight into the dashboard's native storage, skipping the CSV round-trip"""
+    
+    print("=" * 80)
+    print("INGESTING UPDATED TEMPLATES INTO NATIVE STORAGE")
+    print("=" * 80)
+    print(f"Ingest started at: {datetime.now()}")
+    print()
+    
+    run_started = time.perf_counter()
+    manifest = load_manifest()
+    ingest_results = {}
+    to_ingest = {}
+    
+    for template_name, excel_file in EXCEL_TEMPLATES.items():
+        if not os.path.exists(excel_file):
+            ingest_results[template_name] = {'status': 'FILE_NOT_FOUND'}
+            continue
+        known = manifest.get(excel_file, {})
+        state = workbook_state(excel_file, known if 'mtime_ns' in known else None)
+        if not force and known.get('ingested_sha256') == state['sha256']:
+            manifest[excel_file] = {**known, **state}
+            ingest_results[template_name] = {'status': 'UNCHANGED'}
+        else:
+            to_ingest[template_name] = (excel_file, state)
+    
+    # Workbooks are streamed in parallel worker processes in bounded chunks; writes go through DataManager's locks
+    if to_ingest:
+        with ProcessPoolExecutor(max_workers=min(MAX_CONVERT_WORKERS, len(to_ingest))) as pool:
+            futures = {
+                template_name: pool.submit(ingest_workbook, template_name, excel_file)
+                for template_name, (excel_file, _) in to_ingest.items()
+            }
+            for template_name, future in futures.items():
+                excel_file, state = to_ingest[template_name]
+                try:
+                    success, message, seconds = future.result()
+                except Exception as e:
+                    success, message, seconds = False, str(e), 0.0
+                
+                ingest_results[template_name] = {
+                    'status': 'SUCCESS' if success else 'ERROR',
+                    'message': message,
+                    'seconds': seconds
+                }
+                if success:
+                    manifest[excel_file] = {**manifest.get(excel_file, {}), **state, 'ingested_sha256': state['sha256']}
+                print(f"{'✅' if success else '❌'} {template_name}: {message}")
+    
+    save_manifest(manifest)
+    
+    print("\n" + "=" * 80)
+    print("INGEST SUMMARY")
+    print("=" * 80)
+    for name in EXCEL_TEMPLATES:
+        result = ingest_results[name]
+        status_icon = "✅" if result['status'] in ('SUCCESS', 'UNCHANGED') else "❌"
+        timing = f" ({result['seconds']:.2f}s)" if result['status'] == 'SUCCESS' else ""
+        print(f"{status_icon} {name}: {result['status']}{timing}")
+    print()
+    print(f"⏱️ Total time: {time.perf_counter() - run_started:.2f}s")
+    print("=" * 80)
+    
+    return ingest_results
+
+def convert_excel_to_csv(force=False):
+    """Convert the updated Excel templates that changed since the last run to CSV format for analysis"""
     
     print("=" * 80)
     print("CONVERTING UPDATED TEMPLATES TO CSV")
@@ -22,60 +153,95 @@ def convert_excel_to_csv():
     print(f"Conversion started at: {datetime.now()}")
     print()
     
+    run_started = time.perf_counter()
+    manifest = load_manifest()
     conversion_results = {}
+    to_convert = {}
     
-    for template_name, excel_file in excel_templates.items():
-        if os.path.exists(excel_file):
-            try:
-                print(f"📄 Processing: {template_name}")
-                print(f"   File: {excel_file}")
-                
-                # Read Excel file
-                df = pd.read_excel(excel_file)
-                
-                # Generate CSV filename
-                csv_filename = excel_file.replace('.xlsx', '.csv')
-                
-                # Save as CSV
-                df.to_csv(csv_filename, index=False)
-                
-                # Store results
-                conversion_results[template_name] = {
-                    'excel_file': excel_file,
-                    'csv_file': csv_filename,
-                    'shape': df.shape,
-                    'columns': list(df.columns),
-                    'status': 'SUCCESS'
-                }
-                
-                print(f"   ✅ Converted to: {csv_filename}")
-                print(f"   📊 Shape: {df.shape}")
-                print(f"   📋 Columns ({len(df.columns)}): {list(df.columns)}")
-                print()
-                
-                # Display first few rows for verification
-                if not df.empty:
-                    print("   📝 Sample data:")
-                    print(df.head(2).to_string(index=False))
-                else:
-                    print("   ⚠️ Template is empty (header only)")
-                print("-" * 80)
-                
-            except Exception as e:
-                conversion_results[template_name] = {
-                    'excel_file': excel_file,
-                    'status': 'ERROR',
-                    'error': str(e)
-                }
-                print(f"   ❌ Error converting {excel_file}: {e}")
-                print("-" * 80)
-        else:
+    # Detect changed workbooks by content hash; unchanged ones keep their existing CSV
+    for template_name, excel_file in EXCEL_TEMPLATES.items():
+        if not os.path.exists(excel_file):
             conversion_results[template_name] = {
                 'excel_file': excel_file,
                 'status': 'FILE_NOT_FOUND'
             }
             print(f"   ⚠️ File not found: {excel_file}")
-            print("-" * 80)
+            continue
+        
+        known = manifest.get(excel_file, {})
+        state = workbook_state(excel_file, known if 'mtime_ns' in known else None)
+        csv_filename = excel_file.replace('.xlsx', '.csv')
+        if not force and known.get('csv_sha256') == state['sha256'] and os.path.exists(csv_filename):
+            manifest[excel_file] = {**known, **state}
+            conversion_results[template_name] = {
+                'excel_file': excel_file,
+                'csv_file': csv_filename,
+                'shape': tuple(known.get('shape', ())),
+                'columns': known.get('columns', []),
+                'status': 'UNCHANGED',
+                'seconds': 0.0
+            }
+        else:
+            to_convert[template_name] = (excel_file, state)
+    
+    print(f"📄 {len(to_convert)} changed workbook(s) to convert, "
+          f"{sum(1 for r in conversion_results.values() if r['status'] == 'UNCHANGED')} unchanged")
+    print("-" * 80)
+    
+    # Changed workbooks are parsed in parallel worker processes
+    if to_convert:
+        with ProcessPoolExecutor(max_workers=min(MAX_CONVERT_WORKERS, len(to_convert))) as pool:
+            futures = {
+                template_name: pool.submit(convert_workbook, excel_file)
+                for template_name, (excel_file, _) in to_convert.items()
+            }
+            for template_name, future in futures.items():
+                excel_file, state = to_convert[template_name]
+                print(f"📄 Processing: {template_name}")
+                print(f"   File: {excel_file}")
+                try:
+                    result = future.result()
+                    conversion_results[template_name] = {
+                        'excel_file': excel_file,
+                        'csv_file': result['csv_file'],
+                        'shape': result['shape'],
+                        'columns': result['columns'],
+                        'status': 'SUCCESS',
+                        'seconds': result['seconds']
+                    }
+                    manifest[excel_file] = {
+                        **manifest.get(excel_file, {}),
+                        **state,
+                        'csv_sha256': state['sha256'],
+                        'csv_file': result['csv_file'],
+                        'shape': list(result['shape']),
+                        'columns': result['columns'],
+                        'converted_at': datetime.now().isoformat()
+                    }
+                    
+                    print(f"   ✅ Converted to: {result['csv_file']}")
+                    print(f"   📊 Shape: {result['shape']}")
+                    print(f"   📋 Columns ({len(result['columns'])}): {result['columns']}")
+                    print()
+                    
+                    # Display first few rows for verification
+                    if result['sample'] is not None:
+                        print("   📝 Sample data:")
+                        print(result['sample'])
+                    else:
+                        print("   ⚠️ Template is empty (header only)")
+                    print("-" * 80)
+                
+                except Exception as e:
+                    conversion_results[template_name] = {
+                        'excel_file': excel_file,
+                        'status': 'ERROR',
+                        'error': str(e)
+                    }
+                    print(f"   ❌ Error converting {excel_file}: {e}")
+                    print("-" * 80)
+    
+    save_manifest(manifest)
     
     # Summary
     print("\n" + "=" * 80)
@@ -83,20 +249,30 @@ def convert_excel_to_csv():
     print("=" * 80)
     
     successful = sum(1 for r in conversion_results.values() if r['status'] == 'SUCCESS')
+    unchanged = sum(1 for r in conversion_results.values() if r['status'] == 'UNCHANGED')
     total = len(conversion_results)
     
     print(f"Total templates: {total}")
     print(f"Successfully converted: {successful}")
-    print(f"Failed: {total - successful}")
+    print(f"Unchanged (skipped): {unchanged}")
+    print(f"Failed: {total - successful - unchanged}")
     print()
     
-    for name, result in conversion_results.items():
-        status_icon = "✅" if result['status'] == 'SUCCESS' else "❌"
-        print(f"{status_icon} {name}: {result['status']}")
+    for name in EXCEL_TEMPLATES:
+        result = conversion_results[name]
+        status_icon = "✅" if result['status'] in ('SUCCESS', 'UNCHANGED') else "❌"
+        timing = f" ({result['seconds']:.2f}s)" if result['status'] == 'SUCCESS' else ""
+        print(f"{status_icon} {name}: {result['status']}{timing}")
     
+    print()
+    print(f"⏱️ Total time: {time.perf_counter() - run_started:.2f}s")
     print("=" * 80)
     
     return conversion_results
 
 if __name__ == "__main__":
-    results = convert_excel_to_csv()
+    force = '--force' in sys.argv[1:]
+    if '--ingest' in sys.argv[1:]:
+        results = ingest_excel_templates(force=force)
+    else:
+        results = convert_excel_to_csv(force=force)
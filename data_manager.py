@@ -1,11 +1,82 @@
 import pandas as pd
+import numpy as np
 import os
+import hashlib
+import itertools
+import gzip
 import logging
-from datetime import datetime
+import json
+import re
+import shutil
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import closing, contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 import zipfile
 from io import BytesIO
 
+try:
+    import fcntl
+except ImportError:  # Windows has no fcntl; msvcrt provides the equivalent byte-range lock
+    fcntl = None
+    import msvcrt
+
+try:
+    import pyarrow  # noqa: F401 - only needed for the Parquet storage backend
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+# Directory holding the dashboard's native (columnar) data files
+DATA_STORE_DIR = 'data_store'
+
+# Upper bound on threads used to parse datasets in parallel
+MAX_LOAD_WORKERS = 8
+
+# Appended Parquet segments are compacted into the base file once there are this many
+COMPACT_SEGMENT_LIMIT = 8
+
+# Files replaced by a newer snapshot are kept this long for readers still using the old one
+SNAPSHOT_RETENTION_SECONDS = 300
+
+# Backup retention per dataset: the newest BACKUP_KEEP_LAST are always kept, older ones for BACKUP_MAX_AGE_DAYS
+BACKUP_KEEP_LAST = int(os.environ.get('AI_DASHBOARD_BACKUP_KEEP_LAST', 10))
+BACKUP_MAX_AGE_DAYS = int(os.environ.get('AI_DASHBOARD_BACKUP_MAX_AGE_DAYS', 90))
+
+# Superseded dataset versions stay readable ("as of" queries) for this many days. Compaction and
+# upserts keep them as deltas against the new files; a REPLACE, DELETE or RESTORE keeps the old files whole
+HISTORY_RETENTION_DAYS = int(os.environ.get('AI_DASHBOARD_HISTORY_RETENTION_DAYS', 365))
+
+# Memory budget for the LRU of filtered dataset views (per dashboard process)
+FILTERED_VIEW_CACHE_MB = int(os.environ.get('AI_DASHBOARD_VIEW_CACHE_MB', 256))
+
+# Rows per chunk when streaming a workbook into storage; bounds peak memory during Excel ingest
+EXCEL_CHUNK_ROWS = 50000
+
+# Optional embedded SQLite store for indexed filtering (disabled unless a path is configured)
+SQL_STORE_PATH = os.environ.get('AI_DASHBOARD_SQL_STORE')
+# Prefix of the canonical dimension columns stored alongside each dataset in the SQL store
+SQL_DIMENSION_PREFIX = '_dim_'
+
+# Canonical dimensions and the template columns (aliases) that carry them, in order of preference
+FILTER_DIMENSIONS = {
+    'year': ['Year'],
+    'program': ['Program', 'Course', 'Course(GCGM/MGM/GMBA)'],
+    'campus': ['Campus', 'Campus (SG/MUM/SYD/DXB)'],
+    'cohort': ['Cohort']
+}
+
 # Configure logging
 logging.basicConfig(
     filename='data_operations.log',
@@ -13,11 +84,1216 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
+class CSVStorage:
+    """Storage backend that keeps each dataset in its original CSV file"""
+    
+    name = 'csv'
+    extension = '.csv'
+    
+    def path_for(self, source_file, store_dir):
+        """CSV datasets live directly in the import file"""
+        return source_file
+    
+    def read(self, path):
+        return self.read_files(self.files(path))
+    
+    def read_files(self, files):
+        return pd.read_csv(files[0])
+    
+    def read_columns(self, path):
+        """Read only the header row"""
+        return list(pd.read_csv(path, nrows=0).columns)
+    
+    def write(self, df, path, note='', patch=None):
+        """Write a complete new file beside the old one and rename it into place (no history, so patch is unused)"""
+        tmp_path = _temp_path(path)
+        df.to_csv(tmp_path, index=False)
+        os.replace(tmp_path, path)
+    
+    def write_bytes(self, path, parts, note=''):
+        """Replace the file with raw content (e.g. restored from a backup)"""
+        tmp_path = _temp_path(path)
+        with open(tmp_path, 'wb') as f:
+            f.write(parts[0])
+        os.replace(tmp_path, path)
+    
+    def write_chunks(self, chunks, path, note=''):
+        """Write a stream of frames to a new file and rename it into place"""
+        tmp_path = _temp_path(path)
+        for position, chunk in enumerate(chunks):
+            chunk.to_csv(tmp_path, mode='w' if position == 0 else 'a', header=position == 0, index=False)
+        os.replace(tmp_path, path)
+    
+    def append(self, df, path, note=''):
+        """Append to a byte copy of the file, then swap it in, so readers never see a partial row"""
+        tmp_path = _temp_path(path)
+        shutil.copyfile(path, tmp_path)
+        df.to_csv(tmp_path, mode='a', header=False, index=False)
+        os.replace(tmp_path, path)
+    
+    def exists(self, path):
+        return os.path.exists(path)
+    
+    def stat(self, path):
+        return os.stat(path)
+    
+    def files(self, path):
+        return [path]
+    
+    def versions(self, path):
+        """A CSV file keeps no history: only the current version exists"""
+        if not os.path.exists(path):
+            return []
+        modified = datetime.fromtimestamp(os.path.getmtime(path))
+        return [{'version': 1, 'created': modified.isoformat(), 'note': '', 'rows': None}]
+    
+    def snapshot_as_of(self, path, version=None, timestamp=None):
+        current = self.versions(path)
+        if not current or (timestamp is not None and datetime.fromisoformat(current[0]['created']) > timestamp):
+            return None
+        return {'files': [path], 'deltas': [], 'rows': None}
+    
+    def read_snapshot(self, snapshot):
+        return self.read_files(snapshot['files'])
+    
+    def needs_compaction(self, path):
+        return False
+
+
+class ParquetStorage:
+    """Columnar storage backend that preserves dtypes between saves.
+    
+    A dataset is the list of immutable files named in its snapshot manifest. Writers add new
+    files and swap the manifest atomically, so a reader always sees one complete version.
+    The manifest also lists earlier versions, which share every file they have in common.
+    """
+    
+    name = 'parquet'
+    extension = '.parquet'
+    
+    def path_for(self, source_file, store_dir):
+        """Parquet datasets live in the data store, named after the import CSV"""
+        stem = os.path.splitext(os.path.basename(source_file))[0]
+        return os.path.join(store_dir, stem + self.extension)
+    
+    def read(self, path):
+        """Read every file of the current snapshot"""
+        return self.read_files(self.files(path))
+    
+    def read_files(self, files):
+        if not files:
+            return pd.DataFrame()
+        if len(files) == 1:
+            return pd.read_parquet(files[0])
+        return pd.concat([pd.read_parquet(part) for part in files], ignore_index=True)
+    
+    def read_columns(self, path):
+        """Read the column names from the Parquet footer without touching row data"""
+        import pyarrow.parquet as pq
+        return list(pq.read_schema(self.files(path)[0]).names)
+    
+    def write(self, df, path, note='', patch=None):
+        """Publish a snapshot holding only a new base file.
+        
+        A patch marks df as a rewrite of the current version: it holds the previous content of the
+        rows df overwrote, indexed by row position; rows past the old end are new. Earlier versions
+        are then kept as that patch against the new base rather than as the old files.
+        """
+        manifest = self._manifest(path)
+        new_file = self._new_file(path, manifest, lambda tmp: df.to_parquet(tmp, index=False))
+        if patch is not None:
+            self._supersede(path, manifest, [new_file], patch)
+        self._commit(path, manifest, [new_file], note)
+    
+    def write_bytes(self, path, parts, note=''):
+        """Publish a snapshot made of raw Parquet files (e.g. restored from a backup)"""
+        manifest = self._manifest(path)
+        files = []
+        for part in parts:
+            def write(tmp_path, part=part):
+                with open(tmp_path, 'wb') as f:
+                    f.write(part)
+            files.append(self._new_file(path, manifest, write))
+        self._commit(path, manifest, files, note)
+    
+    def write_chunks(self, chunks, path, note=''):
+        """Publish a snapshot with one file per chunk, so only one chunk is held in memory at a time"""
+        manifest = self._manifest(path)
+        files = [
+            self._new_file(path, manifest, lambda tmp, chunk=chunk: chunk.to_parquet(tmp, index=False))
+            for chunk in chunks
+        ]
+        self._commit(path, manifest, files, note)
+    
+    def append(self, df, path, note=''):
+        """Publish a snapshot that adds new rows as one more immutable file (the only new data in this version)"""
+        manifest = self._manifest(path)
+        new_file = self._new_file(path, manifest, lambda tmp: df.to_parquet(tmp, index=False))
+        self._commit(path, manifest, manifest['files'] + [new_file], note)
+    
+    def segment_dir(self, path):
+        return path + '.segments'
+    
+    def manifest_path(self, path):
+        return path + '.snapshot.json'
+    
+    def _manifest(self, path):
+        manifest = _read_json(self.manifest_path(path), None)
+        if manifest is None:
+            # Layout from before snapshot manifests: a base file plus numbered segments
+            if not os.path.exists(path):
+                return {'sequence': 0, 'files': [], 'retired': {}, 'rows': {}, 'versions': []}
+            segment_dir = self.segment_dir(path)
+            segments = sorted(name for name in os.listdir(segment_dir) if name.endswith(self.extension)) if os.path.isdir(segment_dir) else []
+            manifest = {
+                'sequence': max((int(name.split('.')[0]) for name in segments), default=0),
+                'files': [os.path.basename(path)] + [os.path.join(os.path.basename(segment_dir), name) for name in segments],
+                'retired': {},
+                'updated': datetime.fromtimestamp(os.path.getmtime(path)).isoformat()
+            }
+        
+        if 'versions' not in manifest:
+            # Written before history was kept: the current files become the first version
+            root = os.path.dirname(path)
+            manifest['rows'] = {name: self._row_count(os.path.join(root, name)) for name in manifest['files']}
+            manifest['versions'] = [{
+                'version': 1,
+                'created': manifest.get('updated', datetime.now().isoformat()),
+                'note': 'existing data',
+                'files': manifest['files'],
+                'rows': sum(manifest['rows'].values())
+            }] if manifest['files'] else []
+        return manifest
+    
+    @staticmethod
+    def _row_count(file_path):
+        import pyarrow.parquet as pq
+        return pq.read_metadata(file_path).num_rows
+    
+    @staticmethod
+    def _version_files(entry):
+        """Every file a version needs: its data files and the patches of its deltas"""
+        return entry['files'] + [delta['patch'] for delta in entry.get('deltas', []) if delta.get('patch')]
+    
+    def _supersede(self, path, manifest, files, patch):
+        """Re-point every version read from a prefix of the current files at the rewritten files.
+        
+        A version whose files are a prefix of the current ones is the first rows of the current
+        version, so it becomes: the new files, the reverse patch, then its own row count.
+        """
+        current = manifest['files']
+        if not current:
+            return
+        deltas = []
+        if len(patch):
+            root = os.path.dirname(path)
+            rows = manifest.setdefault('rows', {})
+            current_rows = sum(rows[name] if name in rows else self._row_count(os.path.join(root, name)) for name in current)
+            patch_file = self._new_file(path, manifest, lambda tmp: patch.to_parquet(tmp, index=True))
+            deltas = [{'rows': current_rows, 'patch': patch_file}]
+        for entry in manifest.get('versions', []):
+            if entry['files'] and entry['files'] == current[:len(entry['files'])]:
+                entry['files'] = list(files)
+                entry['deltas'] = deltas + entry.get('deltas', [])
+    
+    def _new_file(self, path, manifest, write):
+        """Create a new numbered file with write(tmp_path), renamed to its final name only once complete"""
+        segment_dir = self.segment_dir(path)
+        os.makedirs(segment_dir, exist_ok=True)
+        manifest['sequence'] += 1
+        name = f"{manifest['sequence']:06d}{self.extension}"
+        tmp_path = _temp_path(os.path.join(segment_dir, name))
+        write(tmp_path)
+        relative_name = os.path.join(os.path.basename(segment_dir), name)
+        manifest.setdefault('rows', {})[relative_name] = self._row_count(tmp_path)
+        os.replace(tmp_path, os.path.join(segment_dir, name))
+        return relative_name
+    
+    def _commit(self, path, manifest, files, note=''):
+        """Swap in the new snapshot as the next version, then remove files no retained version uses"""
+        now = time.time()
+        created = datetime.now()
+        rows = manifest.get('rows', {})
+        versions = manifest.get('versions', [])
+        versions.append({
+            'version': versions[-1]['version'] + 1 if versions else 1,
+            'created': created.isoformat(),
+            'note': note,
+            'files': files,
+            'rows': sum(rows.get(name, 0) for name in files)
+        })
+        
+        # History older than the retention window is dropped; the current version is always kept
+        cutoff = created - timedelta(days=HISTORY_RETENTION_DAYS)
+        kept = [entry for entry in versions[:-1] if datetime.fromisoformat(entry['created']) >= cutoff] + versions[-1:]
+        referenced = {name for entry in kept for name in self._version_files(entry)}
+        
+        # Files no version needs any more are only deleted after readers had time to finish with them
+        retired = manifest.get('retired', {})
+        for name in set(manifest['files']).union(*(self._version_files(entry) for entry in versions)) - referenced:
+            retired.setdefault(name, now)
+        expired = [name for name, retired_at in retired.items() if now - retired_at > SNAPSHOT_RETENTION_SECONDS]
+        for name in expired:
+            del retired[name]
+        
+        _write_json(self.manifest_path(path), {
+            'sequence': manifest['sequence'],
+            'files': files,
+            'retired': retired,
+            'rows': {name: count for name, count in rows.items() if name in referenced or name in retired},
+            'versions': kept,
+            'updated': created.isoformat()
+        })
+        
+        root = os.path.dirname(path)
+        for name in expired:
+            try:
+                os.remove(os.path.join(root, name))
+            except FileNotFoundError:
+                pass
+    
+    def exists(self, path):
+        return os.path.exists(self.manifest_path(path)) or os.path.exists(path)
+    
+    def stat(self, path):
+        """Stat of the file that changes whenever a new snapshot is published"""
+        manifest_path = self.manifest_path(path)
+        return os.stat(manifest_path if os.path.exists(manifest_path) else path)
+    
+    def files(self, path):
+        """Files of the current snapshot: the base file followed by appended files in order"""
+        root = os.path.dirname(path)
+        return [os.path.join(root, name) for name in self._manifest(path)['files']]
+    
+    def versions(self, path):
+        """Retained versions, oldest first, without their file lists"""
+        return [{key: value for key, value in entry.items() if key not in ('files', 'deltas')}
+                for entry in self._manifest(path).get('versions', [])]
+    
+    def snapshot_as_of(self, path, version=None, timestamp=None):
+        """How to read the latest version at or before a version number and/or timestamp, or None.
+        
+        Returns {'files', 'deltas', 'rows'} with full paths, for read_snapshot.
+        """
+        candidates = self._manifest(path).get('versions', [])
+        if version is not None:
+            candidates = [entry for entry in candidates if entry['version'] <= version]
+        if timestamp is not None:
+            candidates = [entry for entry in candidates if datetime.fromisoformat(entry['created']) <= timestamp]
+        if not candidates:
+            return None
+        root = os.path.dirname(path)
+        entry = candidates[-1]
+        return {
+            'files': [os.path.join(root, name) for name in entry['files']],
+            'deltas': [dict(delta, patch=os.path.join(root, delta['patch'])) if delta.get('patch') else dict(delta)
+                       for delta in entry.get('deltas', [])],
+            'rows': entry.get('rows')
+        }
+    
+    def read_snapshot(self, snapshot):
+        """Read a version: its files, each reverse delta in turn, then its own row count"""
+        df = self.read_files(snapshot['files'])
+        for delta in snapshot['deltas']:
+            df = df.head(delta['rows'])
+            if delta.get('patch'):
+                patch = pd.read_parquet(delta['patch'])
+                order = np.arange(len(df))
+                order[patch.index.to_numpy()] = len(df) + np.arange(len(patch))
+                df = pd.concat([df, patch], ignore_index=True).take(order).reset_index(drop=True)
+        return df.head(snapshot['rows']) if snapshot['rows'] is not None else df
+    
+    def needs_compaction(self, path):
+        return len(self.files(path)) - 1 >= COMPACT_SEGMENT_LIMIT
+
+
+# Parsed datasets shared by every dashboard session, keyed by storage path
+_dataset_cache = {}
+_content_hashes = {}
+# Views derived from a dataset, keyed by (storage path, dataset version, view key)
+_view_cache = {}
+# Historical ("as of") frames, keyed by their immutable file lists; oldest entries are dropped first
+_history_cache = {}
+HISTORY_CACHE_SIZE = 16
+_cache_lock = threading.Lock()
+
+
+class FilteredViewCache:
+    """Byte-capped LRU of filtered dataset views, keyed by (storage path, dataset version, selections)"""
+    
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (view, size in bytes), least recently used first
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+    
+    def get(self, key):
+        """Cached view for a key (marking it most recently used), or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+    
+    def put(self, key, view):
+        """Store a view, evicting least recently used ones until the cache fits its byte cap"""
+        size = int(view.memory_usage(deep=True).sum())
+        with self._lock:
+            if size > self.max_bytes:
+                return
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            self._entries[key] = (view, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+    
+    def discard(self, path):
+        """Drop every view of one dataset once it has changed"""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == path]:
+                self._bytes -= self._entries.pop(key)[1]
+                self.invalidations += 1
+    
+    def stats(self):
+        """Entry count, bytes used against the cap, and hit, miss and eviction counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations
+            }
+
+
+# Filtered views shared by every dashboard session; repeat filter selections are served from here
+_filtered_views = FilteredViewCache(FILTERED_VIEW_CACHE_MB * 1024 * 1024)
+
+
+def _read_json(path, default):
+    """Read a JSON sidecar file, returning default when it is missing or unreadable"""
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def _temp_path(path):
+    """Private temporary name beside path, for writes that are renamed into place when complete"""
+    return f"{path}.tmp{os.getpid()}_{threading.get_ident()}"
+
+
+def _write_json(path, data):
+    """Write a JSON sidecar file atomically so readers never see a partial file"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = _temp_path(path)
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+# Per-path thread locks and, per thread, how deeply each lock file is already held
+_file_locks = {}
+_held_file_locks = threading.local()
+
+
+@contextmanager
+def file_lock(path):
+    """Exclusive lock shared by threads and other processes; re-entrant within a thread"""
+    with _cache_lock:
+        thread_lock = _file_locks.setdefault(path, threading.RLock())
+    with thread_lock:
+        held = _held_file_locks.__dict__.setdefault('depth', {})
+        if held.get(path):
+            held[path] += 1
+            try:
+                yield
+            finally:
+                held[path] -= 1
+            return
+        
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'a+b') as handle:
+            if fcntl:
+                fcntl.flock(handle, fcntl.LOCK_EX)
+            else:
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK, 1)
+            held[path] = 1
+            try:
+                yield
+            finally:
+                held[path] = 0
+                if fcntl:
+                    fcntl.flock(handle, fcntl.LOCK_UN)
+                else:
+                    handle.seek(0)
+                    msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class WriteQueue:
+    """Per-dataset queue that folds uploads arriving while a write is in progress into one write.
+    
+    A caller finding the queue idle writes its own upload at once. Uploads submitted meanwhile
+    wait, and the same caller then writes them together, handing each caller its own result.
+    """
+    
+    def __init__(self):
+        self.pending = []
+        self.leader = False
+    
+    def submit(self, item, write_batch):
+        request = {'item': item, 'done': threading.Event(), 'result': None, 'error': None}
+        with _cache_lock:
+            self.pending.append(request)
+            lead = not self.leader
+            self.leader = True
+        
+        # A single writer never waits; batching only happens when writes overlap
+        while lead:
+            with _cache_lock:
+                batch, self.pending = self.pending, []
+                if not batch:
+                    self.leader = lead = False
+                    break
+            try:
+                results = write_batch([queued['item'] for queued in batch])
+                for queued, result in zip(batch, results):
+                    queued['result'] = result
+            except Exception as e:
+                for queued in batch:
+                    queued['error'] = e
+            for queued in batch:
+                queued['done'].set()
+        
+        request['done'].wait()
+        if request['error'] is not None:
+            raise request['error']
+        return request['result']
+
+
+_write_queues = {}
+
+
+def write_queue(path):
+    """Shared write queue for the dataset stored at path"""
+    with _cache_lock:
+        return _write_queues.setdefault(path, WriteQueue())
+
+
+def file_fingerprint(path):
+    """Return (path, mtime, size, content hash) for a data file, or None if it is missing"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    
+    # Only re-hash the content when the file's mtime or size has moved
+    with _cache_lock:
+        known = _content_hashes.get(path)
+    if known and known[:2] == (stat.st_mtime_ns, stat.st_size):
+        content_hash = known[2]
+    else:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        content_hash = digest.hexdigest()
+        with _cache_lock:
+            _content_hashes[path] = (stat.st_mtime_ns, stat.st_size, content_hash)
+    
+    return (path, stat.st_mtime_ns, stat.st_size, content_hash)
+
+
+def dataset_fingerprint(paths):
+    """Combine the fingerprints of all files making up a dataset into one (path, mtime, size, hash)"""
+    fingerprints = [fingerprint for fingerprint in map(file_fingerprint, paths) if fingerprint]
+    if len(fingerprints) <= 1:
+        return fingerprints[0] if fingerprints else None
+    
+    combined_hash = hashlib.sha256(''.join(fp[3] for fp in fingerprints).encode()).hexdigest()
+    return (
+        fingerprints[0][0],
+        max(fp[1] for fp in fingerprints),
+        sum(fp[2] for fp in fingerprints),
+        combined_hash
+    )
+
+
+def dataset_stat(paths):
+    """(latest mtime, total size) of the files making up a dataset, from os.stat alone; None if none exist"""
+    stats = []
+    for path in paths:
+        try:
+            stats.append(os.stat(path))
+        except OSError:
+            pass
+    if not stats:
+        return None
+    return (max(stat.st_mtime_ns for stat in stats), sum(stat.st_size for stat in stats))
+
+
+# Bumped whenever row_hashes changes, so persisted row-hash indexes are rebuilt
+ROW_HASH_VERSION = 2
+
+
+def row_hashes(df):
+    """Per-row hashes that do not depend on how narrowly columns were downcast.
+    
+    The schema's float downcast is decided per batch, so float columns are hashed at float32
+    precision: a value stored as float32 and the same value uploaded as float64 hash alike.
+    """
+    canonical = {}
+    for column in df.columns:
+        series = df[column]
+        if pd.api.types.is_bool_dtype(series.dtype):
+            canonical[column] = series.map({True: 1.0, False: 0.0}).astype('float64')
+        elif pd.api.types.is_float_dtype(series.dtype):
+            values = series.to_numpy(dtype='float64', na_value=np.nan)
+            with np.errstate(over='ignore'):
+                canonical[column] = values.astype('float32').astype('float64')
+        elif pd.api.types.is_numeric_dtype(series.dtype):
+            canonical[column] = series.to_numpy(dtype='float64', na_value=np.nan)
+        else:
+            canonical[column] = series.astype(object).where(series.notna(), None)
+    return pd.util.hash_pandas_object(pd.DataFrame(canonical, index=df.index), index=False)
+
+
+# Sorted in-memory copies of row-hash indexes, keyed by index path
+_row_hash_arrays = {}
+
+
+class RowHashIndex:
+    """Persisted, append-only set of row hashes for one dataset"""
+    
+    def __init__(self, path):
+        self.path = path
+        self.meta_path = path + '.json'
+    
+    def is_current(self, checksum):
+        """True if the index was last updated for the dataset content with this checksum"""
+        return os.path.exists(self.path) and _read_json(self.meta_path, {}).get('checksum') == checksum
+    
+    def _file_state(self):
+        stat = os.stat(self.path)
+        return (stat.st_mtime_ns, stat.st_size)
+    
+    def _sorted_hashes(self):
+        # Keyed on mtime as well as size: a rebuild after an upsert can leave the size unchanged
+        state = self._file_state()
+        with _cache_lock:
+            cached = _row_hash_arrays.get(self.path)
+        if cached and cached[0] == state:
+            return cached[1]
+        hashes = np.sort(np.fromfile(self.path, dtype='<u8'))
+        with _cache_lock:
+            _row_hash_arrays[self.path] = (state, hashes)
+        return hashes
+    
+    def contains(self, hashes):
+        """Boolean mask of which hashes are already in the index (binary search per probe)"""
+        existing = self._sorted_hashes()
+        if not len(existing):
+            return np.zeros(len(hashes), dtype=bool)
+        positions = np.searchsorted(existing, hashes).clip(max=len(existing) - 1)
+        return existing[positions] == hashes
+    
+    def rebuild(self, hashes, checksum):
+        """Replace the index with the hashes of every stored row"""
+        hashes = np.asarray(hashes, dtype='<u8')
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = _temp_path(self.path)
+        hashes.tofile(tmp_path)
+        os.replace(tmp_path, self.path)
+        with _cache_lock:
+            _row_hash_arrays[self.path] = (self._file_state(), np.sort(hashes))
+        _write_json(self.meta_path, {'checksum': checksum, 'rows': int(len(hashes))})
+    
+    def add(self, hashes, checksum):
+        """Append hashes of newly stored rows"""
+        hashes = np.asarray(hashes, dtype='<u8')
+        existing = self._sorted_hashes()
+        with open(self.path, 'ab') as f:
+            hashes.tofile(f)
+        with _cache_lock:
+            _row_hash_arrays[self.path] = (self._file_state(), np.sort(np.concatenate([existing, hashes])))
+        meta = _read_json(self.meta_path, {})
+        _write_json(self.meta_path, {'checksum': checksum, 'rows': meta.get('rows', 0) + int(len(hashes))})
+    
+    def set_checksum(self, checksum):
+        """Re-point the index at rewritten files whose rows did not change (e.g. after compaction)"""
+        meta = _read_json(self.meta_path, {})
+        meta['checksum'] = checksum
+        _write_json(self.meta_path, meta)
+
+
+# Values accepted for template columns declared as 'bool'
+YES_NO_VALUES = {'yes': True, 'no': False}
+
+
+def yes_mask(series):
+    """True where a Yes/No column says Yes, whether it was typed as boolean or kept as text.
+    
+    coerce_column leaves a column as text when it holds answers other than Yes/No, so
+    counting code must not assume the boolean dtype.
+    """
+    if pd.api.types.is_bool_dtype(series.dtype):
+        return series.fillna(False).astype(bool)
+    return series.astype('string').str.strip().str.lower().eq('yes').fillna(False).astype(bool)
+
+
+def coerce_column(series, kind):
+    """Convert a column to the compact dtype declared in a template schema"""
+    if kind == 'category':
+        return series if isinstance(series.dtype, pd.CategoricalDtype) else series.astype('category')
+    
+    if kind == 'bool':
+        if pd.api.types.is_bool_dtype(series.dtype):
+            return series.astype('boolean')
+        # SQLite hands booleans back as 0/1 integers
+        if pd.api.types.is_numeric_dtype(series.dtype) and series.dropna().isin([0, 1]).all():
+            return series.astype('boolean')
+        mapped = series.astype('string').str.strip().str.lower().map(YES_NO_VALUES)
+        # Leave the column untouched rather than silently dropping unexpected answers
+        if mapped.isna().sum() != series.isna().sum():
+            return series
+        return mapped.astype('boolean')
+    
+    if kind in ('int', 'float'):
+        try:
+            numeric = pd.to_numeric(series)
+        except (ValueError, TypeError):
+            return series
+        if kind == 'int' and not numeric.isna().any():
+            return pd.to_numeric(numeric, downcast='integer')
+        return pd.to_numeric(numeric, downcast='float')
+    
+    if kind.startswith('date'):
+        # 'date:<format>' names the template's text format; Excel and SQLite hand back real dates
+        if pd.api.types.is_datetime64_any_dtype(series.dtype):
+            return series
+        parsed = pd.to_datetime(series, format=kind.partition(':')[2] or None, errors='coerce')
+        unparsed = parsed.isna() & series.notna()
+        if unparsed.any():
+            # Values in another format are parsed one by one (format='mixed' needs pandas 2)
+            parsed[unparsed] = series[unparsed].map(lambda value: pd.to_datetime(value, errors='coerce'))
+        # Leave the column untouched rather than silently dropping unparseable dates
+        if parsed.isna().sum() != series.isna().sum():
+            return series
+        return parsed
+    
+    return series
+
+
+def open_workbook(source):
+    """Open a workbook (path or file-like) in openpyxl's read-only streaming mode"""
+    from openpyxl import load_workbook
+    return load_workbook(source, read_only=True, data_only=True)
+
+
+def _header_columns(header):
+    """Column names for a header row, named the way pandas names blank header cells"""
+    return [str(name) if name is not None else f"Unnamed: {position}" for position, name in enumerate(header or ())]
+
+
+def sheet_header(sheet):
+    """Empty frame carrying a worksheet's header row, for validating a sheet before reading its rows"""
+    header = next(sheet.iter_rows(max_row=1, values_only=True), None)
+    return pd.DataFrame(columns=_header_columns(header))
+
+
+def iter_sheet_chunks(sheet, chunk_rows=EXCEL_CHUNK_ROWS):
+    """Stream an open worksheet as DataFrames of at most chunk_rows rows.
+    
+    The first row is the header; fully empty rows are skipped. At least one (possibly empty)
+    frame is yielded.
+    """
+    rows = sheet.iter_rows(values_only=True)
+    columns = _header_columns(next(rows, None))
+    width = len(columns)
+    
+    buffer = []
+    emitted = False
+    for row in rows:
+        if all(value is None for value in row):
+            continue
+        buffer.append(tuple(row[:width]) + (None,) * (width - len(row)))
+        if len(buffer) >= chunk_rows:
+            yield pd.DataFrame(buffer, columns=columns).infer_objects()
+            buffer = []
+            emitted = True
+    if buffer or not emitted:
+        yield pd.DataFrame(buffer, columns=columns).infer_objects()
+
+
+def iter_excel_chunks(source, chunk_rows=EXCEL_CHUNK_ROWS, sheet_name=None):
+    """Stream one worksheet of a workbook as DataFrames of at most chunk_rows rows.
+    
+    Uses openpyxl's read-only row iterator, so the workbook is never loaded whole.
+    """
+    workbook = open_workbook(source)
+    try:
+        sheet = workbook[sheet_name] if sheet_name else workbook.active
+        yield from iter_sheet_chunks(sheet, chunk_rows)
+    finally:
+        workbook.close()
+
+
+def column_stats(df):
+    """Per-column statistics stored in the dataset catalog"""
+    stats = {}
+    for column in df.columns:
+        series = df[column]
+        entry = {
+            'dtype': str(series.dtype),
+            'nulls': int(series.isna().sum()),
+            'distinct': int(series.nunique(dropna=True))
+        }
+        if pd.api.types.is_numeric_dtype(series.dtype) and not pd.api.types.is_bool_dtype(series.dtype) and series.notna().any():
+            entry['min'] = float(series.min())
+            entry['max'] = float(series.max())
+            entry['mean'] = round(float(series.mean()), 4)
+        stats[column] = entry
+    return stats
+
+
+def filter_columns(columns):
+    """Map each filter dimension to the first matching column of a dataset"""
+    mapping = {}
+    for dimension, candidates in FILTER_DIMENSIONS.items():
+        for column in candidates:
+            if column in columns:
+                mapping[dimension] = column
+                break
+    return mapping
+
+
+def cohort_year(cohort):
+    """Calendar year of a cohort label such as 'Jan-23' or 'Jul 2024', or None"""
+    match = re.search(r'(\d{4}|\d{2})\s*$', str(cohort))
+    if not match:
+        return None
+    year = int(match.group(1))
+    return year + 2000 if year < 100 else year
+
+
+def dimension_frame(df):
+    """A dataset's canonical dimensions (program, campus, cohort, year) as categorical columns aligned with its rows.
+    
+    Each dimension comes from the first alias column the dataset has. Datasets without a Year
+    column get the year from Cohort.
+    """
+    dimensions = {dimension: df[column].astype('category') for dimension, column in filter_columns(df.columns).items()}
+    if 'year' not in dimensions and 'cohort' in dimensions:
+        cohort = dimensions['cohort'].cat
+        years = pd.array([cohort_year(label) for label in cohort.categories], dtype='Int16')
+        codes = cohort.codes.values
+        derived = pd.array([None] * len(codes), dtype='Int16')
+        derived[codes >= 0] = years[codes[codes >= 0]]
+        dimensions['year'] = pd.Series(derived, index=df.index).astype('category')
+    return pd.DataFrame(dimensions, index=df.index)
+
+
+def dimension_values(df):
+    """Sorted distinct values of each canonical dimension of a dataset, as JSON-ready Python values"""
+    dimensions = dimension_frame(df)
+    return {
+        dimension: sorted({_sql_value(value) for value in dimensions[dimension].dropna().unique()}, key=str)
+        for dimension in dimensions.columns
+    }
+
+
+def merge_dimension_values(old, new):
+    """Union of two dimension dictionaries, kept sorted"""
+    merged = dict(old)
+    for dimension, values in new.items():
+        merged[dimension] = sorted(set(merged.get(dimension, [])) | set(values), key=str)
+    return merged
+
+
+def build_filter_index(dimensions, filtered=('year', 'program', 'campus')):
+    """Packed bitmaps of the rows holding each value of each canonical dimension.
+    
+    Takes a dimension_frame. Returns {dimension: (values, bitmaps, has_nulls)}, where bitmaps[i]
+    is np.packbits of the rows equal to values[i] (one bit per row).
+    """
+    index = {}
+    for dimension in dimensions.columns:
+        if dimension not in filtered:
+            continue
+        column = dimensions[dimension].cat
+        codes = column.codes.values
+        present = codes >= 0
+        bits = np.zeros((len(column.categories), len(codes)), dtype=bool)
+        bits[codes[present], np.flatnonzero(present)] = True
+        index[dimension] = (column.categories, np.packbits(bits, axis=1), not present.all())
+    return index
+
+
+def filter_positions(index, selections, rows):
+    """Row positions matching every selection, as an AND of OR-ed value bitmaps; None if nothing is excluded"""
+    combined = None
+    for dimension, selected in selections.items():
+        if not selected or dimension not in index:
+            continue
+        values, bitmaps, has_nulls = index[dimension]
+        chosen = values.isin(list(selected))
+        if chosen.all() and not has_nulls:
+            continue  # Selecting every value (the "All" default) excludes no rows
+        if chosen.any():
+            dimension_bits = np.bitwise_or.reduce(bitmaps[chosen], axis=0)
+        else:
+            dimension_bits = np.zeros(bitmaps.shape[1], dtype=np.uint8)
+        combined = dimension_bits if combined is None else combined & dimension_bits
+    if combined is None:
+        return None
+    return np.flatnonzero(np.unpackbits(combined, count=rows))
+
+
+class Cube:
+    """Sums, non-null counts and sums of squares of a dataset's numeric columns per dimension cell.
+    
+    A cell is one observed combination of the canonical dimensions (program, campus, cohort,
+    year), so slicing and rolling up cost the number of cells, not the number of rows.
+    """
+    
+    def __init__(self, keys, rows, sums, counts, squares, integers):
+        self.keys = keys          # One row per cell: its dimension values
+        self.rows = rows          # Rows per cell
+        self.sums = sums          # Cells x measures
+        self.counts = counts      # Non-null values per cell and measure
+        self.squares = squares    # Sums of squares per cell and measure
+        self.integers = integers  # Measures whose sums are reported as integers
+    
+    @classmethod
+    def build(cls, df):
+        """Aggregate a dataset into cube cells"""
+        dimensions = dimension_frame(df)
+        alias_columns = set(filter_columns(df.columns).values())
+        measures = [
+            column for column in df.columns
+            if column not in alias_columns and pd.api.types.is_numeric_dtype(df[column])
+            and not isinstance(df[column].dtype, pd.CategoricalDtype)
+        ]
+        values = pd.DataFrame(
+            {column: df[column].to_numpy(dtype='float64', na_value=np.nan) for column in measures}, index=df.index
+        )
+        integers = {column for column in measures
+                    if pd.api.types.is_integer_dtype(df[column]) or pd.api.types.is_bool_dtype(df[column])}
+        
+        # Null dimension values form cells of their own, so no row is lost from the totals
+        keys = list(dimensions.columns)
+        by = [dimensions[key] for key in keys] or [pd.Series(0, index=df.index)]
+        grouped = values.groupby(by, observed=True, dropna=False)
+        sums = grouped.sum()
+        cells = sums.index.to_frame(index=False)
+        return cls(
+            keys=cells[keys] if keys else pd.DataFrame(index=range(len(cells))),
+            rows=grouped.size().to_numpy(),
+            sums=sums.reset_index(drop=True),
+            counts=grouped.count().reset_index(drop=True),
+            squares=(values ** 2).groupby(by, observed=True, dropna=False).sum().reset_index(drop=True),
+            integers=integers
+        )
+    
+    @property
+    def measures(self):
+        """Columns aggregated in the cube; text columns (e.g. Yes/No with other answers) are not"""
+        return list(self.sums.columns)
+    
+    def slice(self, years=None, programs=None, campuses=None):
+        """Cells matching the selected years, programs and campuses (same rules as query_data)"""
+        mask = np.ones(len(self.rows), dtype=bool)
+        for dimension, selected in (('year', years), ('program', programs), ('campus', campuses)):
+            if selected and dimension in self.keys.columns:
+                mask &= self.keys[dimension].isin(list(selected)).to_numpy()
+        return Cube(self.keys[mask].reset_index(drop=True), self.rows[mask],
+                    self.sums[mask].reset_index(drop=True), self.counts[mask].reset_index(drop=True),
+                    self.squares[mask].reset_index(drop=True), self.integers)
+    
+    def _rollup(self, frame, by):
+        return frame.groupby([self.keys[by]], observed=True).sum() if by else frame.sum()
+    
+    def _result(self, values, measures):
+        if isinstance(measures, str):
+            if measures in self.integers:
+                return values.astype('int64') if isinstance(values, pd.Series) else int(values)
+            return values
+        return values.astype({measure: 'int64' for measure in measures if measure in self.integers})
+    
+    def count(self, by=None):
+        """Number of rows, in total or per value of a dimension"""
+        rows = pd.Series(self.rows, dtype='int64')
+        return self._rollup(rows, by) if by else int(rows.sum())
+    
+    def sum(self, measures, by=None):
+        """Sum of one measure (or a list of them), in total or per value of a dimension"""
+        return self._result(self._rollup(self.sums[measures], by), measures)
+    
+    def mean(self, measures, by=None):
+        """Mean of the non-null values of one measure (or a list of them)"""
+        return self._rollup(self.sums[measures], by) / self._rollup(self.counts[measures], by)
+    
+    def std(self, measures, by=None):
+        """Sample standard deviation of one measure (or a list of them), from the sums of squares"""
+        total, count = self._rollup(self.sums[measures], by), self._rollup(self.counts[measures], by)
+        variance = (self._rollup(self.squares[measures], by) - total ** 2 / count) / (count - 1)
+        # Rounding can leave a tiny negative variance for constant values
+        return np.sqrt(np.maximum(variance, 0))
+
+
+def _sql_value(value):
+    """Convert numpy scalars to plain Python values for sqlite3 parameters"""
+    return value.item() if hasattr(value, 'item') else value
+
+
+class SQLiteStore:
+    """Embedded SQLite copy of each dataset, indexed on the dashboard's filter columns"""
+    
+    def __init__(self, path):
+        self.path = path
+    
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        conn = sqlite3.connect(self.path)
+        conn.execute('CREATE TABLE IF NOT EXISTS _dataset_versions (data_type TEXT PRIMARY KEY, version INTEGER)')
+        return conn
+    
+    @staticmethod
+    def table_name(data_type):
+        return re.sub(r'[^0-9a-z]+', '_', data_type.lower()).strip('_')
+    
+    def get_version(self, data_type):
+        """Dataset version the table was last written at, or None"""
+        return self.state(data_type)[0]
+    
+    def state(self, data_type):
+        """(version the table was last written at or None, its canonical dimensions), read over one connection"""
+        with closing(self._connect()) as conn:
+            row = conn.execute('SELECT version FROM _dataset_versions WHERE data_type = ?', (data_type,)).fetchone()
+            columns = [column[1] for column in conn.execute(f'PRAGMA table_info("{self.table_name(data_type)}")')]
+        dimensions = [column[len(SQL_DIMENSION_PREFIX):] for column in columns if column.startswith(SQL_DIMENSION_PREFIX)]
+        return (row[0] if row else None), dimensions
+    
+    def write(self, data_type, df, version):
+        """Replace a dataset's table, stored with its canonical dimension columns, and index those columns.
+        
+        Returns the stored dimensions.
+        """
+        table = self.table_name(data_type)
+        dimensions = dimension_frame(df).add_prefix(SQL_DIMENSION_PREFIX)
+        with closing(self._connect()) as conn:
+            with conn:
+                pd.concat([df, dimensions], axis=1).to_sql(table, conn, if_exists='replace', index=False)
+                for column in dimensions.columns:
+                    conn.execute(f'CREATE INDEX IF NOT EXISTS "idx_{table}_{column}" ON "{table}" ("{column}")')
+                conn.execute('INSERT OR REPLACE INTO _dataset_versions VALUES (?, ?)', (data_type, version))
+        return [column[len(SQL_DIMENSION_PREFIX):] for column in dimensions.columns]
+    
+    def append(self, data_type, df, version):
+        """Insert appended rows, with their dimension columns, into a dataset's existing table"""
+        rows = df.reset_index(drop=True)
+        dimensions = dimension_frame(rows).add_prefix(SQL_DIMENSION_PREFIX)
+        with closing(self._connect()) as conn:
+            with conn:
+                pd.concat([rows, dimensions], axis=1).to_sql(self.table_name(data_type), conn, if_exists='append', index=False)
+                conn.execute('INSERT OR REPLACE INTO _dataset_versions VALUES (?, ?)', (data_type, version))
+    
+    def dimensions(self, data_type):
+        """Canonical dimensions stored for a dataset; empty for tables written before they were added"""
+        return self.state(data_type)[1]
+    
+    def distinct(self, data_type, dimension):
+        """Distinct non-null values of a canonical dimension"""
+        column = SQL_DIMENSION_PREFIX + dimension
+        table = self.table_name(data_type)
+        with closing(self._connect()) as conn:
+            rows = conn.execute(f'SELECT DISTINCT "{column}" FROM "{table}" WHERE "{column}" IS NOT NULL').fetchall()
+        return [row[0] for row in rows]
+    
+    def query(self, data_type, filters):
+        """Rows whose canonical dimensions match all of {dimension: allowed values}, without the dimension columns"""
+        table = self.table_name(data_type)
+        clauses, params = [], []
+        for dimension, values in filters.items():
+            values = [_sql_value(value) for value in values]
+            clauses.append(f'"{SQL_DIMENSION_PREFIX}{dimension}" IN ({", ".join("?" * len(values))})')
+            params.extend(values)
+        
+        sql = f'SELECT * FROM "{table}"'
+        if clauses:
+            sql += ' WHERE ' + ' AND '.join(clauses)
+        with closing(self._connect()) as conn:
+            df = pd.read_sql_query(sql, conn, params=params)
+        return df.drop(columns=[column for column in df.columns if column.startswith(SQL_DIMENSION_PREFIX)])
+
+
+class BackupStore:
+    """Content-addressed, compressed copies of dataset files with a retention policy.
+    
+    Each file is stored once under its SHA-256, so backing up unchanged content takes no space.
+    """
+    
+    def __init__(self, root, keep_last=BACKUP_KEEP_LAST, max_age_days=BACKUP_MAX_AGE_DAYS):
+        self.root = root
+        self.objects_dir = os.path.join(root, 'objects')
+        self.index_file = os.path.join(root, 'index.json')
+        self.keep_last = keep_last
+        self.max_age_days = max_age_days
+    
+    def _object_path(self, digest, suffix):
+        return os.path.join(self.objects_dir, digest[:2], digest + suffix)
+    
+    def _find_object(self, digest):
+        for suffix in ('.zst', '.gz'):
+            path = self._object_path(digest, suffix)
+            if os.path.exists(path):
+                return path
+        return None
+    
+    def _store_object(self, path, digest):
+        """Compress a file into the object store unless identical content is already there"""
+        if self._find_object(digest):
+            return
+        target = self._object_path(digest, '.zst' if ZSTD_AVAILABLE else '.gz')
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp_path = _temp_path(target)
+        with open(path, 'rb') as src, open(tmp_path, 'wb') as dst:
+            if ZSTD_AVAILABLE:
+                zstandard.ZstdCompressor().copy_stream(src, dst)
+            else:
+                with gzip.GzipFile(fileobj=dst, mode='wb') as compressed:
+                    shutil.copyfileobj(src, compressed)
+        os.replace(tmp_path, target)
+    
+    def _load_object(self, digest):
+        path = self._find_object(digest)
+        if path is None:
+            raise FileNotFoundError(f"Backup object {digest} is missing")
+        if path.endswith('.zst'):
+            with open(path, 'rb') as f:
+                return zstandard.ZstdDecompressor().stream_reader(f).read()
+        with gzip.open(path, 'rb') as f:
+            return f.read()
+    
+    def backup(self, data_type, files, storage_name, user_info, reason):
+        """Store the given dataset files and record them as one backup entry"""
+        fingerprints = [fingerprint for fingerprint in map(file_fingerprint, files) if fingerprint]
+        entry_files = [{'name': os.path.basename(path), 'sha256': digest, 'size': size}
+                       for path, _, size, digest in fingerprints]
+        
+        created = datetime.now()
+        entry = {
+            'id': f"{SQLiteStore.table_name(data_type)}-{created.strftime('%Y%m%d_%H%M%S_%f')}",
+            'data_type': data_type,
+            'storage': storage_name,
+            'created': created.isoformat(),
+            'user': user_info,
+            'reason': reason,
+            'files': entry_files
+        }
+        # Objects are written under the index lock, so a concurrent backup's garbage collection
+        # can never remove them (or their temporary files) before the index refers to them
+        with file_lock(self.index_file + '.lock'):
+            for path, _, _, digest in fingerprints:
+                self._store_object(path, digest)
+            index = self._apply_retention(_read_json(self.index_file, []) + [entry])
+            _write_json(self.index_file, index)
+            self._collect_garbage(index)
+        return entry
+    
+    def _apply_retention(self, index):
+        now = datetime.now()
+        seen = {}
+        kept = []
+        for entry in sorted(index, key=lambda entry: entry['created'], reverse=True):
+            rank = seen[entry['data_type']] = seen.get(entry['data_type'], 0) + 1
+            age_days = (now - datetime.fromisoformat(entry['created'])).days
+            if rank <= self.keep_last or age_days < self.max_age_days:
+                kept.append(entry)
+        return kept[::-1]
+    
+    def _collect_garbage(self, index):
+        """Remove objects no remaining backup refers to"""
+        referenced = {file['sha256'] for entry in index for file in entry['files']}
+        if not os.path.isdir(self.objects_dir):
+            return
+        for prefix in os.listdir(self.objects_dir):
+            for name in os.listdir(os.path.join(self.objects_dir, prefix)):
+                if name.split('.')[0] not in referenced:
+                    os.remove(os.path.join(self.objects_dir, prefix, name))
+    
+    def entries(self, data_type=None):
+        """Backup entries, newest first"""
+        index = _read_json(self.index_file, [])
+        return [entry for entry in reversed(index) if data_type is None or entry['data_type'] == data_type]
+    
+    def get(self, backup_id):
+        return next((entry for entry in self.entries() if entry['id'] == backup_id), None)
+    
+    def read_files(self, entry):
+        """Decompressed content of each file in a backup, in dataset order"""
+        return [self._load_object(file['sha256']) for file in entry['files']]
+
+
+def merge_column_stats(old_stats, old_records, new_stats, new_records):
+    """Fold the stats of appended rows into existing catalog stats.
+    
+    Distinct counts become lower bounds until the next full write.
+    """
+    merged = {}
+    for column, new in new_stats.items():
+        old = old_stats.get(column)
+        if old is None:
+            merged[column] = new
+            continue
+        
+        entry = dict(old)
+        entry['nulls'] = old['nulls'] + new['nulls']
+        entry['distinct'] = max(old['distinct'], new['distinct'])
+        if 'min' in new:
+            old_count = old_records - old['nulls'] if 'mean' in old else 0
+            new_count = new_records - new['nulls']
+            entry['min'] = min(old.get('min', new['min']), new['min'])
+            entry['max'] = max(old.get('max', new['max']), new['max'])
+            entry['mean'] = round((old.get('mean', 0) * old_count + new['mean'] * new_count) / (old_count + new_count), 4)
+        merged[column] = entry
+    return merged
+
+
+def default_storage():
+    """Use Parquet when pyarrow is installed, otherwise fall back to CSV"""
+    return ParquetStorage() if PARQUET_AVAILABLE else CSVStorage()
+
+
 class DataManager:
     """Enhanced class to handle data upload, download, merge, and delete operations for all AI initiatives"""
     
-    def __init__(self):
-        # Updated data files mapping
+    def __init__(self, storage=None, store_dir=DATA_STORE_DIR, sql_store_path=SQL_STORE_PATH):
+        # Storage backend for the dashboard's native data files (CSV is kept for import/export)
+        self.storage = storage or default_storage()
+        self.store_dir = store_dir
+        
+        # Optional embedded SQL store: filters run as indexed queries instead of pandas scans
+        self.sql_store = SQLiteStore(sql_store_path) if sql_store_path else None
+        
+        # Compressed, deduplicated backups taken before destructive operations
+        self.backup_store = BackupStore(os.path.join(store_dir, 'backups'))
+        
+        # Updated data files mapping (CSV import/export files)
         self.data_files = {
             'AI Tutor': 'ai_tutor template updated.csv',
             'AI Mentor': 'ai_mentor_template - updated.csv',
@@ -28,42 +1304,155 @@ class DataManager:
             'PRP (Placement Readiness Program)': 'PRP_template - updated.csv'
         }
         
+        # Native storage location for each data type
+        self.storage_files = {
+            data_type: self.storage.path_for(filename, self.store_dir)
+            for data_type, filename in self.data_files.items()
+        }
+        
+        # Per-dataset version counters, bumped on every write to invalidate cached views
+        self.versions_file = os.path.join(self.store_dir, 'dataset_versions.json')
+        # Datasets whose invalidation is being held back until the end of a bulk upload (None: not deferring)
+        self._deferred_invalidations = None
+        # Datasets whose compaction and SQL sync wait until a chunked upload has written its last chunk
+        self._deferred_maintenance = set()
+        # Column names per stored file, refreshed only when a file's mtime or size changes
+        self.schema_manifest_file = os.path.join(self.store_dir, 'schema_manifest.json')
+        # Row counts, column stats, checksum and last writer per dataset, updated on every write
+        self.catalog_file = os.path.join(self.store_dir, 'catalog.json')
+        
         # Enhanced templates with all new columns (will be updated after conversion)
         self.templates = {
             'AI Tutor': {
                 'filename': 'ai_tutor_template_updated.csv',
                 'description': 'Enhanced AI Tutor with additional tracking columns',
-                'columns': []  # Will be populated after conversion
+                'columns': [],  # Will be populated after conversion
+                'key': ['Course(GCGM/MGM/GMBA)', 'Cohort', 'Unit_Name', 'Faculty Name'],
+                'schema': {
+                    'Campus (SG/MUM/SYD/DXB)': 'category',
+                    'Course(GCGM/MGM/GMBA)': 'category',
+                    'Cohort': 'category',
+                    'Unit_Name': 'category',
+                    'Batch_size(number should come from student feedback form)': 'int',
+                    'Unit_Commencement_date': 'date:%d-%b-%Y',
+                    'Unit_End_Date': 'date:%d-%b-%Y',
+                    'No_of_Session_IDs_created': 'int',
+                    'Total_Students_Participated_watched videos': 'int',
+                    'Total_Students_Attempted_AI Tutor Platform Quiz': 'int',
+                    'Average Score of AI Tutor Platform Quiz': 'float',
+                    'No_of_students_who_filled_student feedback form': 'int',
+                    'Faculty_Rating_provide by students': 'float',
+                    'AI_Tutor_quality_score': 'float',
+                    'AI_Tutor_impact_score': 'float',
+                    'Avg_Rating_for_AI_Tutor_Tool': 'float',
+                    'Faculty_Implemented_AI_Tutor_efficiently(Yes/No)': 'bool',
+                    'No. of Quizzes_conducted': 'int',
+                    'AI_Quizzes_used_for_grading': 'bool',
+                    'Average_ Quiz_Score': 'float',
+                    'Faculty_Feedback': 'category'
+                }
             },
             'AI Mentor': {
                 'filename': 'ai_mentor_template_updated.csv',
                 'description': 'AI Mentor feedback and effectiveness tracking',
-                'columns': []  # Will be populated after conversion
+                'columns': [],  # Will be populated after conversion
+                'schema': {
+                    'Academic_Manager_Name': 'category',
+                    'Course': 'category',
+                    'Cohort': 'category',
+                    'Term': 'category',
+                    'Project Type (ARP, IBR 1, IBR 2, Industry Project)': 'category',
+                    'Total Number of students/teams  mentoring/mentored': 'int',
+                    "Q1_Are Students_motivated to use AI Mentor? (Yes/No, as they don't find it useful)": 'bool',
+                    'Q2_Are students using AI Mentor effectively ? (Yes/No)': 'bool',
+                    'Q3_Have you mandated students to meet you only after obtaining suggestions from AI Mentor? (Yes/No)': 'bool',
+                    "Q4_Improvement_observed in student's logical thinking, Presentation & Report Structure with the use of AI Mentor (Yes/No)": 'bool',
+                    'Approx. percentage of students under your guidance who levelled up using AI Mentor.': 'int'
+                }
             },
             'AI Impact': {
                 'filename': 'ai_impact_template_updated.csv',
                 'description': 'Overall AI initiatives impact on student outcomes',
-                'columns': []  # Will be populated after conversion
+                'columns': [],  # Will be populated after conversion
+                'key': ['Student _mail id'],
+                'schema': {
+                    'Course': 'category',
+                    'Cohort': 'category',
+                    'Placed/Not Placed': 'category',
+                    'CGPA': 'float',
+                    'AI Tutor Usage': 'category',
+                    'AI Mentor Usage': 'category',
+                    'JPT Usage': 'category',
+                    'Yoodli Usage': 'category'
+                }
             },
             'AI TKT': {
                 'filename': 'ai_tkt_template_updated.csv',
                 'description': 'Technical Knowledge Test before/after analysis',
-                'columns': []  # Will be populated after conversion
+                'columns': [],  # Will be populated after conversion
+                'schema': {
+                    'Unit': 'category',
+                    'Course': 'category',
+                    'Average Grades Before AI for TKT': 'float',
+                    'Avergae Grades After AI for TKT': 'float',
+                    'Improvement%': 'float'
+                }
             },
             'Unit Performance': {
                 'filename': 'unit_performance_template_updated.csv',
                 'description': 'Unit performance with AI tutor effectiveness tracking',
-                'columns': []  # Will be populated after conversion
+                'columns': [],  # Will be populated after conversion
+                'schema': {
+                    'Course': 'category',
+                    'Cohort': 'category',
+                    'Year': 'int',
+                    'Unit_Name': 'category',
+                    'AI Tutor (Before/After)': 'category',
+                    'Total_Avg_score': 'float'
+                }
             },
             'CR (Corporate Relations)': {
                 'filename': 'cr_template_updated.csv',
                 'description': 'Corporate Relations and placement data',
-                'columns': []  # Will be populated after conversion
+                'columns': [],  # Will be populated after conversion
+                'schema': {
+                    'Course': 'category',
+                    'Cohort': 'category',
+                    'Year': 'int',
+                    'Industry_Sector': 'category',
+                    'Company_Tier': 'category',
+                    'Job_role': 'category',
+                    'Location': 'category',
+                    'No. of Vacancies_Offered': 'int',
+                    'Date of first interview(mm/dd/yyyy)': 'date:%m/%d/%Y',
+                    'No. of Students_Eligible': 'int',
+                    'No. of students applied': 'int',
+                    'No. of Students_Interviewed': 'int',
+                    'Students_Selected': 'int',
+                    'Avg_CTC(in USD)': 'float',
+                    'Highest_CTC(in USD)': 'float',
+                    'Students used JPT(Yes/No)': 'bool'
+                }
             },
             'PRP (Placement Readiness Program)': {
                 'filename': 'prp_template_updated.csv',
                 'description': 'Placement Readiness Program evaluation and JPT integration',
-                'columns': []  # Will be populated after conversion
+                'columns': [],  # Will be populated after conversion
+                'key': ['Student Roll No.'],
+                'schema': {
+                    'Course': 'category',
+                    'Cohort': 'category',
+                    'Year': 'int',
+                    'Term-1': 'float',
+                    'Term-2': 'float',
+                    'Term-3': 'float',
+                    'No. of JPT Mock Interviews attempted and scored equal or above 80%': 'int',
+                    'Area Head Mock Interview Score': 'float',
+                    'No. of Allocated Interview Attempts': 'int',
+                    'Categorise student overall (Outstanding, Good, Average, Needs Handholding)': 'category',
+                    'Placed/Not Placed': 'category',
+                    'If placed, no. of interview attempts required for placement': 'int'
+                }
             }
         }
         
@@ -71,22 +1460,290 @@ class DataManager:
         self._initialize_column_structures()
     
     def _initialize_column_structures(self):
-        """Initialize column structures from converted CSV files"""
-        for data_type, filename in self.data_files.items():
-            if os.path.exists(filename):
-                try:
-                    df = pd.read_csv(filename)
-                    if data_type in self.templates:
-                        self.templates[data_type]['columns'] = list(df.columns)
-                except Exception as e:
-                    st.warning(f"Could not load columns for {data_type}: {e}")
+        """Initialize column structures from the schema manifest, reading headers only for changed files"""
+        manifest = _read_json(self.schema_manifest_file, {})
+        changed = False
+        
+        for data_type in self.data_files:
+            filename = self._sync_from_csv(data_type)
+            if not filename or data_type not in self.templates:
+                continue
+            try:
+                stat = self.storage.stat(filename)
+                entry = manifest.get(data_type)
+                if not entry or (entry['path'], entry['mtime_ns'], entry['size']) != (filename, stat.st_mtime_ns, stat.st_size):
+                    entry = {
+                        'path': filename,
+                        'mtime_ns': stat.st_mtime_ns,
+                        'size': stat.st_size,
+                        'columns': self.storage.read_columns(filename)
+                    }
+                    manifest[data_type] = entry
+                    changed = True
+                self.templates[data_type]['columns'] = list(entry['columns'])
+            except Exception as e:
+                st.warning(f"Could not load columns for {data_type}: {e}")
+        
+        if changed:
+            try:
+                _write_json(self.schema_manifest_file, manifest)
+            except OSError as e:
+                logging.warning(f"Could not write schema manifest: {e}")
+    
+    def _sync_from_csv(self, data_type):
+        """Import the CSV file into native storage when it is newer, return the storage path"""
+        csv_file = self.data_files.get(data_type)
+        store_file = self.storage_files.get(data_type)
+        if not store_file:
+            return None
+        
+        if store_file != csv_file and csv_file and os.path.exists(csv_file) and self._csv_is_newer(csv_file, store_file):
+            try:
+                with self._dataset_lock(data_type):
+                    # Another session may have imported it while this one waited for the lock
+                    if self._csv_is_newer(csv_file, store_file):
+                        os.makedirs(os.path.dirname(store_file) or '.', exist_ok=True)
+                        imported_df = self._storage_frame(pd.read_csv(csv_file), data_type)
+                        self.storage.write(imported_df, store_file, note=f"IMPORT ({csv_file})")
+                        self.invalidate(data_type)
+                        self._update_catalog(data_type, imported_df, f"CSV import ({csv_file})", "IMPORT")
+                        logging.info(f"Operation: IMPORT | Data Type: {data_type} | Details: {csv_file} -> {store_file}")
+            except Exception as e:
+                st.warning(f"Could not import {csv_file} into {self.storage.name} storage: {e}")
+        
+        return store_file if self.storage.exists(store_file) else None
+    
+    def _csv_is_newer(self, csv_file, store_file):
+        return not self.storage.exists(store_file) or os.path.getmtime(csv_file) > self.storage.stat(store_file).st_mtime
+    
+    def _dataset_lock(self, data_type):
+        """Cross-process lock held around every read-modify-write of a dataset"""
+        name = os.path.basename(self.storage_files[data_type])
+        return file_lock(os.path.join(self.store_dir, name + '.lock'))
+    
+    def get_version(self, data_type):
+        """Current version counter of a dataset"""
+        return _read_json(self.versions_file, {}).get(data_type, 0)
+    
+    def invalidate(self, data_type):
+        """Bump a dataset's version and evict only its cached frame and derived views"""
+        with _cache_lock:
+            deferred = self._deferred_invalidations
+            if deferred is not None:
+                # Inside deferred_invalidation(): evict now so this process stays correct, bump at the end
+                self._evict(data_type)
+                deferred.add(data_type)
+        if deferred is not None:
+            return self.get_version(data_type)
+        return self.invalidate_many([data_type])[data_type]
+    
+    def invalidate_many(self, data_types):
+        """Bump several datasets' versions in one write and evict their cached frames and views"""
+        with file_lock(self.versions_file + '.lock'), _cache_lock:
+            versions = _read_json(self.versions_file, {})
+            for data_type in data_types:
+                versions[data_type] = versions.get(data_type, 0) + 1
+                self._evict(data_type)
+            _write_json(self.versions_file, versions)
+        return versions
+    
+    def _evict(self, data_type):
+        """Drop a dataset's cached frame and derived views (caller holds _cache_lock)"""
+        filename = self.storage_files.get(data_type)
+        _dataset_cache.pop(filename, None)
+        for key in [key for key in _view_cache if key[0] == filename]:
+            del _view_cache[key]
+        _filtered_views.discard(filename)
+    
+    @contextmanager
+    def deferred_invalidation(self):
+        """Hold back version bumps made inside the block and apply them in a single step at the end"""
+        self._deferred_invalidations = set()
+        try:
+            yield
+        finally:
+            with _cache_lock:
+                pending, self._deferred_invalidations = self._deferred_invalidations, None
+            if pending:
+                self.invalidate_many(pending)
+                # SQL copies are keyed on the version, so they catch up only once it is bumped
+                if self.sql_store is not None:
+                    for data_type in pending:
+                        self._sync_sql_store(data_type)
+    
+    @contextmanager
+    def deferred_maintenance(self, data_type):
+        """Skip compaction and SQL sync after each write to a dataset inside the block and run them once at the end"""
+        with _cache_lock:
+            self._deferred_maintenance.add(data_type)
+        try:
+            yield
+        finally:
+            with _cache_lock:
+                self._deferred_maintenance.discard(data_type)
+            if self.storage.needs_compaction(self.storage_files[data_type]):
+                self.compact_data(data_type)
+            if self.sql_store is not None:
+                self._sync_sql_store(data_type)
+    
+    def _maintenance_deferred(self, data_type):
+        """Whether compaction and SQL sync for a dataset are held back by deferred_maintenance()"""
+        with _cache_lock:
+            return data_type in self._deferred_maintenance
+    
+    def cached_view(self, data_type, view_key, builder):
+        """Return a view derived from a dataset, rebuilding it only after the dataset changes"""
+        # Keyed by storage path so managers on different backends never share views
+        key = (self.storage_files.get(data_type), self.get_version(data_type), view_key)
+        with _cache_lock:
+            if key in _view_cache:
+                return _view_cache[key]
+        view = builder(self.load_cached_data(data_type))
+        with _cache_lock:
+            # Views of older versions can never be served again, so drop them to keep the cache bounded
+            for stale in [stale for stale in _view_cache if stale[0] == key[0] and stale[1] < key[1]]:
+                del _view_cache[stale]
+            _view_cache[key] = view
+        return view
+    
+    def apply_schema(self, df, data_type):
+        """Apply the template's declared dtypes (categoricals, Yes/No booleans, downcast numerics)"""
+        schema = self.templates.get(data_type, {}).get('schema', {})
+        if df.empty or not schema:
+            return df
+        
+        converted = {
+            column: coerce_column(df[column], kind)
+            for column, kind in schema.items()
+            if column in df.columns
+        }
+        return df.assign(**converted) if converted else df
+    
+    def to_export_frame(self, df, data_type):
+        """Convert schema dtypes back to the template's CSV representation"""
+        schema = self.templates.get(data_type, {}).get('schema', {})
+        bool_columns = [
+            column for column, kind in schema.items()
+            if kind == 'bool' and column in df.columns and pd.api.types.is_bool_dtype(df[column].dtype)
+        ]
+        date_columns = {
+            column: kind.partition(':')[2] for column, kind in schema.items()
+            if kind.startswith('date') and column in df.columns and pd.api.types.is_datetime64_any_dtype(df[column].dtype)
+        }
+        if not bool_columns and not date_columns:
+            return df
+        
+        export_df = df.copy()
+        for column in bool_columns:
+            export_df[column] = export_df[column].map({True: 'Yes', False: 'No'})
+        for column, date_format in date_columns.items():
+            export_df[column] = export_df[column].dt.strftime(date_format or '%Y-%m-%d')
+        return export_df
+    
+    def _row_index_path(self, data_type):
+        stem = os.path.splitext(os.path.basename(self.data_files[data_type]))[0]
+        return os.path.join(self.store_dir, stem + '.rowhashes')
+    
+    def _row_index(self, data_type):
+        """Row-hash index for a dataset, rebuilt from stored data only if it is out of date"""
+        index = RowHashIndex(self._row_index_path(data_type))
+        checksum = self._row_index_checksum(data_type)
+        if not index.is_current(checksum):
+            existing_df = self.load_cached_data(data_type)
+            columns = self.templates[data_type]['columns']
+            hashes = row_hashes(existing_df[columns]).values if not existing_df.empty else []
+            index.rebuild(hashes, checksum)
+        return index
+    
+    def _row_index_checksum(self, data_type):
+        """Dataset checksum plus the template schema and hash version, since row hashes depend on both"""
+        filename = self.storage_files[data_type]
+        fingerprint = self._dataset_fingerprint(filename) if self.storage.exists(filename) else None
+        if fingerprint is None:
+            return None
+        schema = json.dumps(self.templates[data_type].get('schema', {}), sort_keys=True)
+        return f"{fingerprint[3]}-{hashlib.sha256(schema.encode()).hexdigest()[:12]}-v{ROW_HASH_VERSION}"
+    
+    def _upload_hashes(self, new_df, data_type):
+        """Typed upload restricted to template columns, with its row hashes"""
+        new_df_filtered = self.apply_schema(new_df[self.templates[data_type]['columns']], data_type)
+        return new_df_filtered, row_hashes(new_df_filtered)
+    
+    def count_duplicates(self, new_df, data_type):
+        """Count upload rows that merge would skip, probing the row-hash index with the upload only"""
+        _, new_hashes = self._upload_hashes(new_df, data_type)
+        within_upload = new_hashes.duplicated().values
+        already_stored = self._row_index(data_type).contains(new_hashes.values)
+        return {
+            'already_stored': int(already_stored.sum()),
+            'within_upload': int((within_upload & ~already_stored).sum()),
+            'new': int((~within_upload & ~already_stored).sum())
+        }
+    
+    def _dataset_fingerprint(self, filename):
+        """Fingerprint over every file (base and segments) making up a stored dataset"""
+        return dataset_fingerprint(self.storage.files(filename))
+    
+    def _update_catalog(self, data_type, df, user_info, operation, appended=False, summary=None):
+        """Record row count, column stats, checksum and writer for a dataset just written.
+        
+        With appended=True, df holds only the new rows and is folded into the existing entry.
+        summary=(records, column stats, dimension values) supplies figures already gathered while
+        streaming, in which case df only provides the columns.
+        """
+        filename = self.storage_files[data_type]
+        fingerprint = self._dataset_fingerprint(filename)
+        if fingerprint is None:
+            return
+        
+        records, stats, dimensions = summary if summary is not None else (len(df), column_stats(df), dimension_values(df))
+        previous = _read_json(self.catalog_file, {}).get(data_type) if appended else None
+        if previous:
+            stats = merge_column_stats(previous['column_stats'], previous['records'], stats, records)
+            records += previous['records']
+            # Entries written before dimension values were recorded are rebuilt on the next full write or scan
+            dimensions = merge_dimension_values(previous['dimension_values'], dimensions) if 'dimension_values' in previous else None
+        
+        entry = {
+            'records': records,
+            'columns': len(df.columns),
+            'column_stats': stats,
+            'dimension_values': dimensions,
+            'checksum': fingerprint[3],
+            'mtime_ns': fingerprint[1],
+            'size': fingerprint[2],
+            'last_modified': datetime.fromtimestamp(fingerprint[1] / 1e9).strftime('%Y-%m-%d %H:%M:%S'),
+            'last_writer': user_info,
+            'last_operation': operation
+        }
+        with file_lock(self.catalog_file + '.lock'), _cache_lock:
+            catalog = _read_json(self.catalog_file, {})
+            catalog[data_type] = entry
+            _write_json(self.catalog_file, catalog)
+    
+    def get_catalog(self, data_type):
+        """Catalog entry for a dataset, rebuilt from the file only if it was changed outside DataManager"""
+        filename = self._sync_from_csv(data_type)
+        if not filename:
+            return None
+        
+        # Freshness comes from os.stat only; contents are hashed just when the entry is rebuilt
+        entry = _read_json(self.catalog_file, {}).get(data_type)
+        stat = dataset_stat(self.storage.files(filename))
+        if entry and stat and (entry['mtime_ns'], entry['size']) == stat:
+            return entry
+        
+        self._update_catalog(data_type, self.load_existing_data(data_type), "Unknown (external change)", "SCAN")
+        return _read_json(self.catalog_file, {}).get(data_type)
     
     def log_operation(self, operation, data_type, user_info, details=""):
         """Log data operations for audit trail"""
         log_message = f"Operation: {operation} | Data Type: {data_type} | User: {user_info} | Details: {details}"
         logging.info(log_message)
         
-        # Also create a session log for display
+        # Also create a session log for display (not when run outside Streamlit, e.g. the --ingest CLI)
+        if get_script_run_ctx() is None:
+            return
         if 'operation_logs' not in st.session_state:
             st.session_state.operation_logs = []
         
@@ -150,28 +1807,443 @@ class DataManager:
         
         return True, "Valid data structure"
     
+    def ingest_frame(self, df, data_type, user_info, mode="replace"):
+        """Validate a frame against its template and write it to native storage (mode: replace, merge or upsert)"""
+        is_valid, message = self.validate_uploaded_data(df, data_type)
+        if not is_valid:
+            return False, message
+        
+        if mode == "merge":
+            _, success, msg = self.append_data(df, data_type, user_info)
+        elif mode == "upsert":
+            _, success, msg = self.upsert_data(df, data_type, user_info)
+        else:
+            new_df, success, msg = self.replace_data(df, data_type, user_info)
+            if success:
+                success, msg = self.save_data(new_df, data_type, user_info, "REPLACE")
+                msg = f"Replaced all data with {len(new_df)} records" if success else msg
+        return success, msg
+    
+    def ingest_zip(self, source, user_info, mode="merge", progress=None):
+        """Validate and write every template CSV in a ZIP laid out like download_all_templates, in parallel.
+        
+        Members are matched to templates by file name and each is parsed, validated and written on
+        a worker thread. progress(done, total, data_type) is called as each one finishes, and cached
+        views are invalidated once, after all members are written. Returns
+        (success, message, {data_type: (success, message)}).
+        """
+        try:
+            with zipfile.ZipFile(source) as archive:
+                by_filename = {template['filename'].casefold(): data_type for data_type, template in self.templates.items()}
+                members = {}
+                for name in archive.namelist():
+                    data_type = by_filename.get(os.path.basename(name).casefold())
+                    if data_type is not None and data_type not in members:
+                        members[data_type] = name
+                contents = {data_type: archive.read(name) for data_type, name in members.items()}
+                ignored = [name for name in archive.namelist()
+                           if not name.endswith('/') and name not in members.values()]
+        except Exception as e:
+            return False, f"Error reading ZIP file: {e}", {}
+        
+        if not contents:
+            return False, "No files named after a template were found", {}
+        
+        # Share the Streamlit script context so st.warning from validation still reaches the page
+        ctx = get_script_run_ctx()
+        
+        def ingest(data_type):
+            if ctx is not None:
+                add_script_run_ctx(threading.current_thread(), ctx)
+            try:
+                df = pd.read_csv(BytesIO(contents[data_type]))
+            except Exception as e:
+                return False, f"Error reading {members[data_type]}: {e}"
+            return self.ingest_frame(df, data_type, user_info, mode)
+        
+        results = {}
+        with self.deferred_invalidation():
+            # Datasets are written under their own locks, so different members never contend
+            with ThreadPoolExecutor(max_workers=min(MAX_LOAD_WORKERS, len(contents))) as pool:
+                futures = {pool.submit(ingest, data_type): data_type for data_type in contents}
+                for future in as_completed(futures):
+                    data_type = futures[future]
+                    try:
+                        results[data_type] = future.result()
+                    except Exception as e:
+                        results[data_type] = (False, f"Error ingesting data: {e}")
+                    if progress is not None:
+                        progress(len(results), len(contents), data_type)
+        
+        results = {data_type: results[data_type] for data_type in self.templates if data_type in results}
+        succeeded = sum(1 for success, _ in results.values() if success)
+        message = f"Ingested {succeeded} of {len(results)} file(s)"
+        if ignored:
+            message += f"; ignored file(s) with no matching template: {', '.join(ignored)}"
+        logging.info(f"Operation: ZIP | User: {user_info} | Details: {message}")
+        return succeeded == len(results), message, results
+    
+    def ingest_excel(self, source, data_type, user_info, mode="replace", chunk_rows=EXCEL_CHUNK_ROWS):
+        """Stream a workbook (path or file-like) straight into native storage, with no CSV step.
+        
+        Rows are read and written in chunks of at most chunk_rows, so peak memory does not grow
+        with the size of the workbook.
+        """
+        try:
+            chunks = iter_excel_chunks(source, chunk_rows)
+            first = next(chunks)
+        except Exception as e:
+            return False, f"Error reading workbook: {e}"
+        
+        is_valid, message = self.validate_uploaded_data(first, data_type)
+        if not is_valid:
+            return False, message
+        return self._ingest_chunks(itertools.chain([first], chunks), data_type, user_info, mode)
+    
+    def _ingest_chunks(self, chunks, data_type, user_info, mode):
+        """Write a stream of validated frames to one dataset (mode: replace, merge or upsert)"""
+        try:
+            if mode == "replace":
+                records = self._stream_replace(chunks, data_type, user_info)
+                self.log_operation("REPLACE", data_type, user_info, f"Replaced all data with {records} records from a workbook")
+                return True, f"Replaced all data with {records} records"
+            
+            total = written = chunk_count = 0
+            # Compaction and the SQL copy catch up once after the last chunk, not after every chunk
+            with self.deferred_maintenance(data_type):
+                for chunk in chunks:
+                    if mode == "upsert":
+                        changed, success, msg = self.upsert_data(chunk, data_type, user_info)
+                    else:
+                        changed, success, msg = self.append_data(chunk, data_type, user_info)
+                    if not success:
+                        return False, msg
+                    total += len(chunk)
+                    written += len(changed)
+                    chunk_count += 1
+            return True, f"Processed {total} rows in {chunk_count} chunk(s): {written} written, {total - written} duplicate or unchanged"
+            
+        except Exception as e:
+            return False, f"Error ingesting workbook: {e}"
+    
+    def workbook_sheet_name(self, data_type):
+        """Sheet name for a template in a combined workbook; Excel caps sheet names at 31 characters"""
+        return data_type if len(data_type) <= 31 else data_type.split(' (')[0]
+    
+    def match_workbook_sheets(self, sheet_names):
+        """Map sheet names to data types, accepting the full template name, its sheet name or its abbreviation"""
+        aliases = {}
+        for data_type in self.templates:
+            for alias in (data_type, self.workbook_sheet_name(data_type), data_type.split(' (')[0]):
+                aliases.setdefault(alias.strip().casefold(), data_type)
+        return {
+            sheet_name: aliases[sheet_name.strip().casefold()]
+            for sheet_name in sheet_names if sheet_name.strip().casefold() in aliases
+        }
+    
+    def download_workbook_template(self):
+        """One workbook with an empty sheet per template, in the layout ingest_workbook reads"""
+        buffer = BytesIO()
+        with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
+            for data_type, template in self.templates.items():
+                pd.DataFrame(columns=template['columns']).to_excel(
+                    writer, sheet_name=self.workbook_sheet_name(data_type), index=False
+                )
+        return buffer.getvalue()
+    
+    def ingest_workbook(self, source, user_info, mode="replace", chunk_rows=EXCEL_CHUNK_ROWS):
+        """Ingest every template from one workbook whose sheets are named after the templates.
+        
+        The workbook is opened once. Every matched sheet's header is validated before any data
+        is written; sheets are then streamed in chunks like ingest_excel, and each dataset's
+        version is bumped once, after all sheets are written. Returns
+        (success, message, {data_type: (success, message)}).
+        """
+        try:
+            workbook = open_workbook(source)
+        except Exception as e:
+            return False, f"Error reading workbook: {e}", {}
+        
+        try:
+            sheets = self.match_workbook_sheets(workbook.sheetnames)
+            if not sheets:
+                return False, "No sheets named after a template were found", {}
+            if len(set(sheets.values())) < len(sheets):
+                return False, "More than one sheet maps to the same template", {}
+            
+            for sheet_name, data_type in sheets.items():
+                is_valid, message = self.validate_uploaded_data(sheet_header(workbook[sheet_name]), data_type)
+                if not is_valid:
+                    return False, f"Sheet '{sheet_name}': {message}", {}
+            
+            results = {}
+            with self.deferred_invalidation():
+                for sheet_name, data_type in sheets.items():
+                    results[data_type] = self._ingest_chunks(
+                        iter_sheet_chunks(workbook[sheet_name], chunk_rows), data_type, user_info, mode
+                    )
+        finally:
+            workbook.close()
+        
+        ignored = [name for name in workbook.sheetnames if name not in sheets]
+        succeeded = sum(1 for success, _ in results.values() if success)
+        message = f"Ingested {succeeded} of {len(results)} sheet(s)"
+        if ignored:
+            message += f"; ignored sheet(s) with no matching template: {', '.join(ignored)}"
+        logging.info(f"Operation: WORKBOOK | User: {user_info} | Details: {message}")
+        return succeeded == len(results), message, results
+    
+    def _stream_replace(self, chunks, data_type, user_info):
+        """Replace a dataset with a stream of frames published as one new version; returns the row count"""
+        filename = self.storage_files[data_type]
+        columns = self.templates[data_type]['columns']
+        summary = {'records': 0, 'stats': {}, 'dimensions': {}, 'hashes': [], 'columns': None}
+        
+        def stored_chunks():
+            # Catalog stats and row hashes are gathered on the way through, so nothing is re-read
+            for chunk in chunks:
+                typed = self.apply_schema(chunk[columns], data_type)
+                stats = column_stats(typed)
+                if summary['records']:
+                    stats = merge_column_stats(summary['stats'], summary['records'], stats, len(typed))
+                summary['stats'] = stats
+                summary['dimensions'] = merge_dimension_values(summary['dimensions'], dimension_values(typed))
+                summary['records'] += len(typed)
+                summary['hashes'].append(row_hashes(typed).values)
+                if summary['columns'] is None:
+                    summary['columns'] = typed.head(0)
+                yield self._storage_frame(typed, data_type)
+        
+        os.makedirs(os.path.dirname(filename) or '.', exist_ok=True)
+        with self._dataset_lock(data_type):
+            self.storage.write_chunks(stored_chunks(), filename, note=f"REPLACE ({user_info})")
+            self.invalidate(data_type)
+            self._update_catalog(data_type, summary['columns'], user_info, "REPLACE",
+                                 summary=(summary['records'], summary['stats'], summary['dimensions']))
+            RowHashIndex(self._row_index_path(data_type)).rebuild(
+                np.concatenate(summary['hashes']), self._row_index_checksum(data_type)
+            )
+            if self.sql_store is not None:
+                self._sync_sql_store(data_type)
+        return summary['records']
+    
     def load_existing_data(self, data_type):
-        """Load existing data file"""
-        filename = self.data_files.get(data_type)
-        if filename and os.path.exists(filename):
+        """Load existing data from native storage"""
+        filename = self._sync_from_csv(data_type)
+        if filename:
             try:
-                return pd.read_csv(filename)
+                return self.apply_schema(self.storage.read(filename), data_type)
             except Exception as e:
                 st.error(f"Error loading existing data: {e}")
                 return pd.DataFrame()
         return pd.DataFrame()
     
+    def load_cached_data(self, data_type):
+        """Load data through the shared cache, parsing the file only when its fingerprint changed.
+        
+        The returned frame is shared between sessions and must be treated as read-only.
+        """
+        filename = self._sync_from_csv(data_type)
+        # Fingerprint and read one snapshot's file list, so a concurrent write cannot mix versions
+        files = self.storage.files(filename) if filename else []
+        fingerprint = dataset_fingerprint(files)
+        if fingerprint is None:
+            return pd.DataFrame()
+        
+        with _cache_lock:
+            cached = _dataset_cache.get(filename)
+        # Same content hash means the file was rewritten or touched without changing
+        if cached and cached[0][3] == fingerprint[3]:
+            if cached[0] != fingerprint:
+                with _cache_lock:
+                    _dataset_cache[filename] = (fingerprint, cached[1])
+            return cached[1]
+        
+        try:
+            df = self.apply_schema(self.storage.read_files(files), data_type)
+        except Exception as e:
+            st.error(f"Error loading existing data: {e}")
+            return pd.DataFrame()
+        
+        with _cache_lock:
+            _dataset_cache[filename] = (fingerprint, df)
+        return df
+    
+    def list_versions(self, data_type):
+        """Recorded versions of a dataset, oldest first (version, created, note, rows)"""
+        filename = self._sync_from_csv(data_type)
+        return self.storage.versions(filename) if filename else []
+    
+    def load_as_of(self, data_type, version=None, timestamp=None):
+        """Dataset as it was at a recorded version and/or point in time; an empty template if it did not exist yet"""
+        if version is None and timestamp is None:
+            return self.load_cached_data(data_type)
+        filename = self._sync_from_csv(data_type)
+        snapshot = self.storage.snapshot_as_of(filename, version, timestamp) if filename else None
+        if not snapshot:
+            return self.create_template(data_type) if self.templates[data_type]['columns'] else pd.DataFrame()
+        
+        key = json.dumps(snapshot, sort_keys=True)
+        with _cache_lock:
+            if key in _history_cache:
+                return _history_cache[key]
+        try:
+            df = self.apply_schema(self.storage.read_snapshot(snapshot), data_type)
+        except Exception as e:
+            st.error(f"Error loading historical data: {e}")
+            return pd.DataFrame()
+        with _cache_lock:
+            _history_cache[key] = df
+            while len(_history_cache) > HISTORY_CACHE_SIZE:
+                del _history_cache[next(iter(_history_cache))]
+        return df
+    
+    def load_many(self, data_types=None, cached=True, as_of=None):
+        """Load several datasets in parallel on a bounded thread pool, returning {data_type: df}.
+        
+        With as_of (a datetime), each dataset is loaded as it stood at that moment.
+        """
+        data_types = list(data_types) if data_types is not None else list(self.data_files)
+        loader = self.load_cached_data if cached else self.load_existing_data
+        if as_of is not None:
+            loader = lambda data_type: self.load_as_of(data_type, timestamp=as_of)
+        if len(data_types) <= 1:
+            return {data_type: loader(data_type) for data_type in data_types}
+        
+        # Share the Streamlit script context so st.error/st.warning still reach the page
+        ctx = get_script_run_ctx()
+        
+        def load(data_type):
+            if ctx is not None:
+                add_script_run_ctx(threading.current_thread(), ctx)
+            return loader(data_type)
+        
+        # Parquet/CSV parsing releases the GIL for most of its work, so threads overlap well
+        with ThreadPoolExecutor(max_workers=min(MAX_LOAD_WORKERS, len(data_types))) as pool:
+            frames = list(pool.map(load, data_types))
+        return dict(zip(data_types, frames))
+    
+    def _sync_sql_store(self, data_type, df=None, appended=None):
+        """Bring the SQL copy of a dataset up to its current version, returning its stored dimensions.
+        
+        appended=(version before the append, appended rows) lets a table that was current before
+        an append take just those rows instead of being rewritten.
+        """
+        version = self.get_version(data_type)
+        stored_version, dimensions = self.sql_store.state(data_type)
+        # Tables written before canonical dimensions were stored are rewritten once
+        if stored_version == version and dimensions:
+            return dimensions
+        if appended is not None and stored_version == appended[0] and dimensions:
+            self.sql_store.append(data_type, appended[1], version)
+            return dimensions
+        if df is None:
+            df = self.load_existing_data(data_type)
+        return self.sql_store.write(data_type, df, version)
+    
+    def dimensions(self, data_type, as_of=None):
+        """Canonical program, campus, cohort and year columns of a dataset, resolved once per dataset version"""
+        if as_of is not None:
+            return dimension_frame(self.load_as_of(data_type, timestamp=as_of))
+        return self.cached_view(data_type, ('dimensions',), dimension_frame)
+    
+    def get_filter_values(self, data_type, as_of=None):
+        """Distinct values of each canonical dimension present in a dataset"""
+        if as_of is None:
+            # The catalog keeps a dimension dictionary per version, so no row data is read here
+            entry = self.get_catalog(data_type)
+            if entry and entry.get('dimension_values') is not None:
+                return entry['dimension_values']
+            if entry:
+                return self._backfill_dimension_values(data_type)
+        
+        if self.sql_store is not None and as_of is None:
+            return {dimension: self.sql_store.distinct(data_type, dimension) for dimension in self._sync_sql_store(data_type)}
+        
+        dimensions = self.dimensions(data_type, as_of)
+        return {dimension: list(dimensions[dimension].dropna().unique()) for dimension in dimensions.columns}
+    
+    def _backfill_dimension_values(self, data_type):
+        """Add the dimension dictionary to a catalog entry recorded before it was kept"""
+        with self._dataset_lock(data_type):
+            values = dimension_values(self.load_cached_data(data_type))
+            with file_lock(self.catalog_file + '.lock'), _cache_lock:
+                catalog = _read_json(self.catalog_file, {})
+                if data_type in catalog:
+                    catalog[data_type]['dimension_values'] = values
+                    _write_json(self.catalog_file, catalog)
+        return values
+    
+    def filter_options(self, as_of=None):
+        """Sorted distinct values of each canonical dimension across all datasets, for the sidebar filters"""
+        options = {}
+        for data_type in self.data_files:
+            options = merge_dimension_values(options, self.get_filter_values(data_type, as_of))
+        return options
+    
+    def query_data(self, data_type, years=None, programs=None, campuses=None, as_of=None):
+        """Rows of a dataset matching the selected years, programs and campuses (as of a datetime if given)"""
+        selections = {'year': years, 'program': programs, 'campus': campuses}
+        if as_of is not None:
+            return self._run_query(data_type, selections, as_of)
+        
+        # Selections are order-insensitive, so equal choices share one cache entry
+        key = (self.storage_files[data_type], self.get_version(data_type)) + tuple(
+            tuple(sorted(set(values), key=str)) if values else None for values in selections.values()
+        )
+        view = _filtered_views.get(key)
+        if view is None:
+            view = self._run_query(data_type, selections, as_of)
+            _filtered_views.put(key, view)
+        # Shallow copy, so callers cannot add columns to the cached view
+        return view.copy(deep=False)
+    
+    def cube(self, data_type, as_of=None):
+        """Pre-aggregated cube of a dataset, built once per dataset version"""
+        if as_of is not None:
+            return Cube.build(self.load_as_of(data_type, timestamp=as_of))
+        return self.cached_view(data_type, ('cube',), Cube.build)
+    
+    def filtered_view_stats(self):
+        """Hit, miss and eviction counters of the shared filtered-view cache"""
+        return _filtered_views.stats()
+    
+    def _run_query(self, data_type, selections, as_of):
+        """Filter a dataset through the SQL store or the cached bitmap index"""
+        # The SQL copy only holds the current version, so historical queries filter in pandas
+        if self.sql_store is not None and as_of is None:
+            stored = self._sync_sql_store(data_type)
+            filters = {dimension: values for dimension, values in selections.items() if values and dimension in stored}
+            return self.apply_schema(self.sql_store.query(data_type, filters), data_type)
+        
+        if as_of is None:
+            # Bitmaps are built once per dataset version; the frame is cached with them so positions always match
+            df, index = self.cached_view(data_type, ('filter_index',),
+                                         lambda df: (df, build_filter_index(dimension_frame(df))))
+        else:
+            df = self.load_as_of(data_type, timestamp=as_of)
+            index = build_filter_index(dimension_frame(df))
+        
+        positions = filter_positions(index, selections, len(df))
+        if positions is None:
+            # Nothing excluded: a shallow copy, so callers cannot add columns to the cached frame
+            return df.copy(deep=False)
+        return df.take(positions)
+    
     def merge_data(self, existing_df, new_df, data_type, user_info):
         """Merge new data with existing data"""
         try:
             # Filter new data to only include expected columns
             expected_columns = self.templates[data_type]['columns']
-            new_df_filtered = new_df[expected_columns]
+            new_df_filtered = self.apply_schema(new_df[expected_columns], data_type)
             
             if existing_df.empty:
                 merged_df = new_df_filtered
             else:
-                merged_df = pd.concat([existing_df, new_df_filtered], ignore_index=True)
+                # Re-apply the schema because concat widens mismatched categoricals to object
+                merged_df = self.apply_schema(
+                    pd.concat([existing_df, new_df_filtered], ignore_index=True), data_type
+                )
             
             # Remove duplicates if any
             merged_df = merged_df.drop_duplicates()
@@ -184,12 +2256,171 @@ class DataManager:
         except Exception as e:
             return existing_df, False, f"Error merging data: {e}"
     
+    def append_data(self, new_df, data_type, user_info):
+        """Incremental merge: append only rows not already stored, without rewriting existing data"""
+        filename = self.storage_files.get(data_type)
+        if not filename:
+            return pd.DataFrame(), False, "Invalid data type"
+        
+        try:
+            new_df_filtered, new_hashes = self._upload_hashes(new_df, data_type)
+            
+            # Concurrent uploads to this dataset are deduplicated and written together
+            is_new = write_queue(filename).submit(
+                (new_df_filtered, new_hashes, user_info),
+                lambda batch: self._append_batch(data_type, batch)
+            )
+            rows_to_append = new_df_filtered[is_new]
+            
+            skipped = len(new_df_filtered) - len(rows_to_append)
+            self.log_operation("MERGE", data_type, user_info,
+                             f"Appended {len(rows_to_append)} records, skipped {skipped} duplicates")
+            
+            return rows_to_append, True, f"Appended {len(rows_to_append)} new records ({skipped} duplicates skipped)"
+            
+        except Exception as e:
+            return pd.DataFrame(), False, f"Error appending data: {e}"
+    
+    def _append_batch(self, data_type, batch):
+        """Append one or more (rows, row hashes, user) uploads in a single write, returning each upload's is-new mask"""
+        filename = self.storage_files[data_type]
+        frames = [frame for frame, _, _ in batch]
+        hashes = pd.concat([frame_hashes for _, frame_hashes, _ in batch], ignore_index=True)
+        rows = frames[0] if len(frames) == 1 else self.apply_schema(pd.concat(frames, ignore_index=True), data_type)
+        
+        with self._dataset_lock(data_type):
+            # Drop exact duplicates within the batch and against rows already stored
+            index = self._row_index(data_type)
+            is_new = ~hashes.duplicated().values & ~index.contains(hashes.values)
+            rows_to_append = rows[is_new]
+            
+            if not rows_to_append.empty:
+                os.makedirs(os.path.dirname(filename) or '.', exist_ok=True)
+                stored_rows = self._storage_frame(rows_to_append, data_type)
+                writers = ', '.join(dict.fromkeys(user for _, _, user in batch))
+                previous_version = self.get_version(data_type)
+                if self.storage.exists(filename):
+                    self.storage.append(stored_rows, filename, note=f"APPEND ({writers})")
+                else:
+                    self.storage.write(stored_rows, filename, note=f"APPEND ({writers})")
+                self.invalidate(data_type)
+                self._update_catalog(data_type, stored_rows, writers, "APPEND", appended=True)
+                index.add(hashes.values[is_new], self._row_index_checksum(data_type))
+                if not self._maintenance_deferred(data_type):
+                    if self.storage.needs_compaction(filename):
+                        self.compact_data(data_type)
+                    if self.sql_store is not None:
+                        # Only the new rows are inserted when the table was current before this append
+                        self._sync_sql_store(data_type, appended=(previous_version, rows_to_append))
+        
+        bounds = np.cumsum([0] + [len(frame) for frame in frames])
+        return [is_new[begin:end] for begin, end in zip(bounds[:-1], bounds[1:])]
+    
+    def _key_index(self, data_type):
+        """Hash index from natural-key hash to the row holding that key, built once per dataset version"""
+        key = self.templates[data_type]['key']
+        
+        def build(df):
+            if df.empty:
+                return pd.Index([], dtype='uint64'), np.array([], dtype='int64')
+            key_hashes = row_hashes(df[key])
+            # If stored data already repeats a key, the last occurrence is the one updated
+            latest = ~key_hashes.duplicated(keep='last').values
+            return pd.Index(key_hashes.values[latest]), np.flatnonzero(latest)
+        
+        return self.cached_view(data_type, ('key_index',), build)
+    
+    def upsert_data(self, new_df, data_type, user_info):
+        """Insert-or-update by the template's natural key: corrected records overwrite stored ones in place"""
+        filename = self.storage_files.get(data_type)
+        key = self.templates.get(data_type, {}).get('key')
+        if not filename or not key:
+            return pd.DataFrame(), False, f"No natural key declared for {data_type}"
+        
+        try:
+            new_df_filtered, _ = self._upload_hashes(new_df, data_type)
+            missing_key = new_df_filtered[key].isna().any(axis=1)
+            if missing_key.any():
+                return pd.DataFrame(), False, f"{int(missing_key.sum())} rows have no value for key column(s): {', '.join(key)}"
+            
+            # When the upload repeats a key, its last row wins
+            upload_keys = row_hashes(new_df_filtered[key])
+            latest = ~upload_keys.duplicated(keep='last').values
+            new_df_filtered = new_df_filtered[latest]
+            
+            # Hold the dataset lock from reading the key index until the new version is written
+            with self._dataset_lock(data_type):
+                key_index, key_rows = self._key_index(data_type)
+                found = key_index.get_indexer(upload_keys.values[latest])
+                matched = found >= 0
+                inserts = new_df_filtered[~matched]
+                updates = new_df_filtered[matched]
+                targets = key_rows[found[matched]]
+            
+                # Rows whose key matches but whose content is identical are left alone
+                existing_df = self.load_cached_data(data_type)
+                if len(targets):
+                    changed = row_hashes(updates).values != row_hashes(existing_df.iloc[targets]).values
+                    updates, targets = updates[changed], targets[changed]
+                unchanged = int(matched.sum()) - len(updates)
+            
+                if updates.empty:
+                    # Nothing to overwrite: new keys go through the append path
+                    if not inserts.empty:
+                        self._append_batch(data_type, [(inserts, row_hashes(inserts), user_info)])
+                    self.log_operation("UPSERT", data_type, user_info,
+                                     f"Updated 0 records, inserted {len(inserts)}, unchanged {unchanged}")
+                    return inserts, True, f"Updated 0 records, inserted {len(inserts)} new records ({unchanged} unchanged)"
+            
+                # Splice updated rows into their stored positions and add new keys at the end
+                stored_count = len(existing_df)
+                order = np.arange(stored_count)
+                order[targets] = stored_count + np.arange(len(updates))
+                order = np.concatenate([order, stored_count + len(updates) + np.arange(len(inserts))])
+                combined = pd.concat([existing_df, updates, inserts], ignore_index=True)
+                result_df = self.apply_schema(combined.take(order).reset_index(drop=True), data_type)
+            
+                # History keeps the overwritten rows as a patch instead of a full copy of the old data
+                patch = self._storage_frame(existing_df.iloc[targets], data_type).set_axis(targets)
+                success, msg = self.save_data(result_df, data_type, user_info, "UPSERT", patch=patch)
+                if not success:
+                    return pd.DataFrame(), False, msg
+                RowHashIndex(self._row_index_path(data_type)).rebuild(
+                    row_hashes(result_df).values, self._row_index_checksum(data_type)
+                )
+            
+            self.log_operation("UPSERT", data_type, user_info,
+                             f"Updated {len(updates)} records, inserted {len(inserts)}, unchanged {unchanged}")
+            
+            return pd.concat([updates, inserts]), True, f"Updated {len(updates)} records, inserted {len(inserts)} new records ({unchanged} unchanged)"
+            
+        except Exception as e:
+            return pd.DataFrame(), False, f"Error upserting data: {e}"
+    
+    def compact_data(self, data_type):
+        """Fold appended segments back into a single base file"""
+        filename = self.storage_files.get(data_type)
+        if not filename or len(self.storage.files(filename)) <= 1:
+            return False
+        
+        with self._dataset_lock(data_type):
+            index = self._row_index(data_type)
+            df = self._storage_frame(self.storage.read(filename), data_type)
+            previous = _read_json(self.catalog_file, {}).get(data_type, {})
+            # Same rows in one file: earlier versions become prefixes of it, so the old files can go
+            self.storage.write(df, filename, note="COMPACT", patch=df.head(0))
+            self._update_catalog(data_type, df, previous.get('last_writer', 'Unknown'), "COMPACT")
+            # Same rows in fewer files: keep the row-hash index instead of rebuilding it
+            index.set_checksum(self._row_index_checksum(data_type))
+        logging.info(f"Operation: COMPACT | Data Type: {data_type} | Details: {len(df)} records")
+        return True
+    
     def replace_data(self, new_df, data_type, user_info):
         """Replace existing data with new data"""
         try:
             # Filter new data to only include expected columns
             expected_columns = self.templates[data_type]['columns']
-            new_df_filtered = new_df[expected_columns]
+            new_df_filtered = self.apply_schema(new_df[expected_columns], data_type)
             
             self.log_operation("REPLACE", data_type, user_info, 
                              f"Replaced all data with {len(new_df_filtered)} new records")
@@ -199,58 +2430,125 @@ class DataManager:
         except Exception as e:
             return pd.DataFrame(), False, f"Error replacing data: {e}"
     
-    def save_data(self, df, data_type):
-        """Save data to file"""
-        filename = self.data_files.get(data_type)
+    def save_data(self, df, data_type, user_info="Unknown", operation="SAVE", patch=None):
+        """Save data to native storage (patch: previous content of overwritten rows, see ParquetStorage.write)"""
+        filename = self.storage_files.get(data_type)
         if filename:
             try:
-                df.to_csv(filename, index=False)
+                os.makedirs(os.path.dirname(filename) or '.', exist_ok=True)
+                stored_df = self._storage_frame(df, data_type)
+                with self._dataset_lock(data_type):
+                    self.storage.write(stored_df, filename, note=f"{operation} ({user_info})", patch=patch)
+                    self.invalidate(data_type)
+                    self._update_catalog(data_type, stored_df, user_info, operation)
+                    if self.sql_store is not None and not self._maintenance_deferred(data_type):
+                        self._sync_sql_store(data_type, stored_df)
                 return True, "Data saved successfully"
             except Exception as e:
                 return False, f"Error saving data: {e}"
         return False, "Invalid data type"
     
+    def _storage_frame(self, df, data_type):
+        """Frame as written to storage: typed for Parquet, template text for CSV"""
+        if isinstance(self.storage, CSVStorage):
+            return self.to_export_frame(df, data_type)
+        return self.apply_schema(df, data_type)
+    
+    def export_data(self, data_type):
+        """Export stored data as CSV bytes for download"""
+        df = self.to_export_frame(self.load_existing_data(data_type), data_type)
+        csv_buffer = BytesIO()
+        df.to_csv(csv_buffer, index=False)
+        return csv_buffer.getvalue()
+    
     def delete_data(self, data_type, user_info):
         """Delete all data for a specific type"""
         try:
-            filename = self.data_files.get(data_type)
-            if filename and os.path.exists(filename):
-                # Create backup before deletion
-                backup_filename = f"{filename}.backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-                df = pd.read_csv(filename)
-                df.to_csv(backup_filename, index=False)
-                
-                # Create empty dataframe with correct structure
-                empty_df = self.create_template(data_type)
-                empty_df.to_csv(filename, index=False)
+            filename = self._sync_from_csv(data_type)
+            if filename:
+                with self._dataset_lock(data_type):
+                    # Back up the stored files as they are before deletion
+                    backup_id = self.backup_data(data_type, user_info, "DELETE")['id']
+                    
+                    # Create empty dataframe with correct structure
+                    empty_df = self.create_template(data_type)
+                    self.storage.write(empty_df, filename, note=f"DELETE ({user_info})")
+                    self.invalidate(data_type)
+                    self._update_catalog(data_type, empty_df, user_info, "DELETE")
+                    if self.sql_store is not None:
+                        self._sync_sql_store(data_type, empty_df)
                 
                 self.log_operation("DELETE", data_type, user_info, 
-                                 f"All data deleted, backup created: {backup_filename}")
+                                 f"All data deleted, backup created: {backup_id}")
                 
-                return True, f"Data deleted successfully. Backup created: {backup_filename}"
+                return True, f"Data deleted successfully. Backup created: {backup_id}"
             else:
                 return False, "Data file not found"
                 
         except Exception as e:
             return False, f"Error deleting data: {e}"
     
+    def backup_data(self, data_type, user_info, reason="MANUAL"):
+        """Back up a dataset's stored files byte for byte, returning the backup entry"""
+        filename = self.storage_files[data_type]
+        with self._dataset_lock(data_type):
+            return self.backup_store.backup(data_type, self.storage.files(filename), self.storage.name, user_info, reason)
+    
+    def list_backups(self, data_type=None):
+        """Backups still retained, newest first"""
+        return self.backup_store.entries(data_type)
+    
+    def restore_backup(self, backup_id, user_info):
+        """Restore a dataset to the content of a backup, backing up its current content first"""
+        entry = self.backup_store.get(backup_id)
+        if entry is None:
+            return False, f"Backup not found: {backup_id}"
+        data_type = entry['data_type']
+        filename = self.storage_files.get(data_type)
+        if not filename:
+            return False, "Invalid data type"
+        if entry['storage'] != self.storage.name:
+            return False, f"Backup {backup_id} holds {entry['storage']} files but data is stored as {self.storage.name}"
+        
+        try:
+            # Read first: backing up the current content may prune this entry under the retention policy
+            parts = self.backup_store.read_files(entry)
+            with self._dataset_lock(data_type):
+                if self.storage.exists(filename):
+                    self.backup_data(data_type, user_info, "RESTORE")
+                self.storage.write_bytes(filename, parts, note=f"RESTORE {backup_id} ({user_info})")
+                self.invalidate(data_type)
+                restored_df = self.load_existing_data(data_type)
+                self._update_catalog(data_type, restored_df, user_info, "RESTORE")
+                if self.sql_store is not None:
+                    self._sync_sql_store(data_type, restored_df)
+            
+            self.log_operation("RESTORE", data_type, user_info,
+                             f"Restored backup {backup_id} ({len(restored_df)} records)")
+            return True, f"Restored {len(restored_df)} records from backup {backup_id}"
+            
+        except Exception as e:
+            return False, f"Error restoring backup: {e}"
+    
     def get_data_summary(self):
-        """Get summary of all data files"""
+        """Get summary of all data files from the catalog (no data files are parsed)"""
         summary = {}
-        for data_type, filename in self.data_files.items():
-            if os.path.exists(filename):
-                try:
-                    df = pd.read_csv(filename)
+        for data_type in self.data_files:
+            try:
+                entry = self.get_catalog(data_type)
+                if entry:
                     summary[data_type] = {
-                        'records': len(df),
-                        'last_modified': datetime.fromtimestamp(os.path.getmtime(filename)).strftime('%Y-%m-%d %H:%M:%S'),
-                        'file_size': f"{os.path.getsize(filename) / 1024:.1f} KB",
+                        'records': entry['records'],
+                        'last_modified': entry['last_modified'],
+                        'file_size': f"{entry['size'] / 1024:.1f} KB",
+                        'last_writer': entry['last_writer'],
+                        'checksum': entry['checksum'][:12],
                         'description': self.templates[data_type]['description']
                     }
-                except Exception as e:
-                    summary[data_type] = {'error': str(e)}
-            else:
-                summary[data_type] = {'records': 0, 'status': 'File not found'}
+                else:
+                    summary[data_type] = {'records': 0, 'status': 'File not found'}
+            except Exception as e:
+                summary[data_type] = {'error': str(e)}
         
         return summary
     
@@ -260,6 +2558,8 @@ class DataManager:
             return {
                 'description': self.templates[data_type]['description'],
                 'columns': self.templates[data_type]['columns'],
-                'column_count': len(self.templates[data_type]['columns'])
+                'column_count': len(self.templates[data_type]['columns']),
+                'key': self.templates[data_type].get('key', []),
+                'dimensions': filter_columns(self.templates[data_type]['columns'])
             }
         return None
@@ -0,0 +1,466 @@
+import os
+import shutil
+import threading
+import time
+import zipfile
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import data_manager
+from data_manager import BackupStore, Cube, DataManager, FilteredViewCache, WriteQueue, cohort_year, yes_mask
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+@pytest.fixture
+def manager(tmp_path, monkeypatch):
+    """DataManager over a private copy of the template CSVs, with its own data store"""
+    for name in os.listdir(REPO_DIR):
+        if name.endswith('.csv'):
+            shutil.copy(os.path.join(REPO_DIR, name), tmp_path / name)
+    monkeypatch.chdir(tmp_path)
+    return DataManager()
+
+
+def raw_csv(manager, data_type):
+    """Template CSV as a user would upload it"""
+    return pd.read_csv(manager.data_files[data_type])
+
+
+def test_merge_skips_stored_rows_when_float_width_differs(manager):
+    stored = manager.load_existing_data('AI Impact')
+    assert stored['CGPA'].dtype == 'float32'
+
+    # A value float32 cannot hold keeps the upload's CGPA column at float64
+    upload = raw_csv(manager, 'AI Impact').head(3)
+    extra = upload.head(1).assign(**{'CGPA': 123456.78, 'Student _mail id': 'new.student@spjain.edu'})
+    upload = pd.concat([upload, extra], ignore_index=True)
+
+    assert manager.count_duplicates(upload, 'AI Impact') == {'already_stored': 3, 'within_upload': 0, 'new': 1}
+    appended, success, _ = manager.append_data(upload, 'AI Impact', 'tester')
+    assert success and len(appended) == 1
+    assert len(manager.load_existing_data('AI Impact')) == len(stored) + 1
+
+
+def test_upsert_updates_only_changed_rows(manager):
+    data_type = 'PRP (Placement Readiness Program)'
+    stored = manager.load_existing_data(data_type)
+
+    upload = raw_csv(manager, data_type).head(5)
+    upload.loc[[0, 1], 'Term-1'] = 55.5
+    # The new row's score keeps Term-2 at float64, unlike the stored float32 column
+    extra = upload.head(1).assign(**{'Student Roll No.': 'SPJNEW0001', 'Term-2': 123456.78})
+    upload = pd.concat([upload, extra], ignore_index=True)
+
+    changed, success, message = manager.upsert_data(upload, data_type, 'tester')
+    assert success, message
+    assert message == "Updated 2 records, inserted 1 new records (3 unchanged)"
+    assert len(changed) == 3
+
+    result = manager.load_existing_data(data_type)
+    assert len(result) == len(stored) + 1
+    # Updated rows stay in place; untouched rows keep their values; the new key goes last
+    assert (result['Term-1'].iloc[:2] == 55.5).all()
+    pd.testing.assert_frame_equal(result.iloc[2:len(stored)].reset_index(drop=True),
+                                  stored.iloc[2:].reset_index(drop=True), check_dtype=False)
+    assert result['Student Roll No.'].iloc[-1] == 'SPJNEW0001'
+
+
+def test_yes_mask_counts_typed_and_unmapped_answers(manager):
+    column = 'Q2_Are students using AI Mentor effectively ? (Yes/No)'
+    raw = raw_csv(manager, 'AI Mentor').head(4)
+    raw[column] = ['Yes', 'No', 'yes ', None]
+    typed = manager.apply_schema(raw, 'AI Mentor')
+    assert pd.api.types.is_bool_dtype(typed[column].dtype)
+    assert yes_mask(typed[column]).tolist() == [True, False, True, False]
+
+    # An answer outside Yes/No keeps the column as text; Yes answers still count
+    raw[column] = ['Yes', 'Maybe', 'yes ', None]
+    typed = manager.apply_schema(raw, 'AI Mentor')
+    assert not pd.api.types.is_bool_dtype(typed[column].dtype)
+    assert yes_mask(typed[column]).tolist() == [True, False, True, False]
+
+
+def test_cube_matches_row_scan_and_omits_text_columns(manager):
+    df = manager.load_existing_data('CR (Corporate Relations)')
+    cube = manager.cube('CR (Corporate Relations)').slice(programs=['MGB'])
+    rows = df[df['Course'] == 'MGB']
+    assert cube.count() == len(rows)
+    assert cube.sum('Students_Selected') == rows['Students_Selected'].sum()
+    assert cube.mean('Avg_CTC(in USD)') == pytest.approx(rows['Avg_CTC(in USD)'].mean())
+
+    mentor = raw_csv(manager, 'AI Mentor')
+    column = 'Q2_Are students using AI Mentor effectively ? (Yes/No)'
+    mentor.loc[0, column] = 'Maybe'
+    typed = manager.apply_schema(mentor, 'AI Mentor')
+    assert column not in Cube.build(typed).measures
+
+
+def test_excel_ingest_outside_streamlit(manager, tmp_path):
+    workbook = tmp_path / 'upload.xlsx'
+    raw_csv(manager, 'AI TKT').to_excel(workbook, index=False)
+
+    # Small chunks exercise the streaming path; operation logs need no Streamlit session
+    success, message = manager.ingest_excel(str(workbook), 'AI TKT', 'cli', mode='replace', chunk_rows=30)
+    assert success, message
+    assert len(manager.load_existing_data('AI TKT')) == len(raw_csv(manager, 'AI TKT'))
+    success, message = manager.ingest_excel(str(workbook), 'AI TKT', 'cli', mode='merge', chunk_rows=30)
+    assert success and '0 written' in message
+
+
+def test_chunked_merge_compacts_and_syncs_sql_once(manager, tmp_path, monkeypatch):
+    sql_manager = DataManager(sql_store_path=str(tmp_path / 'store.db'))
+    rows = raw_csv(manager, 'AI TKT').head(30)
+    rows['Unit'] = [f'Chunked unit {i}' for i in range(len(rows))]
+    workbook = tmp_path / 'merge.xlsx'
+    rows.to_excel(workbook, index=False)
+
+    calls = []
+    compact_data = sql_manager.compact_data
+    monkeypatch.setattr(data_manager, 'COMPACT_SEGMENT_LIMIT', 2)
+    monkeypatch.setattr(sql_manager, 'compact_data', lambda data_type: calls.append('compact') or compact_data(data_type))
+    for method in ('write', 'append'):
+        original = getattr(sql_manager.sql_store, method)
+        monkeypatch.setattr(sql_manager.sql_store, method,
+                            lambda *args, method=method, original=original: calls.append(method) or original(*args))
+
+    # Six chunks each append a segment, but compaction and the SQL copy run once after the last one
+    success, message = sql_manager.ingest_excel(str(workbook), 'AI TKT', 'cli', mode='merge', chunk_rows=5)
+    assert success and '30 written' in message, message
+    assert calls == ['compact', 'write']
+    assert sql_manager.sql_store.get_version('AI TKT') == sql_manager.get_version('AI TKT')
+    assert len(sql_manager.sql_store.query('AI TKT', {})) == len(sql_manager.load_existing_data('AI TKT'))
+
+
+def test_workbook_ingest_bumps_each_dataset_version_once(manager, tmp_path):
+    new_values = [f'Workbook row {i}' for i in range(12)]
+    uploads = {
+        'AI TKT': raw_csv(manager, 'AI TKT').head(12).assign(Unit=new_values),
+        'CR (Corporate Relations)': raw_csv(manager, 'CR (Corporate Relations)').head(12).assign(Job_role=new_values),
+    }
+    workbook = tmp_path / 'all_templates.xlsx'
+    with pd.ExcelWriter(workbook, engine='openpyxl') as writer:
+        for data_type, rows in uploads.items():
+            rows.to_excel(writer, sheet_name=manager.workbook_sheet_name(data_type), index=False)
+        pd.DataFrame({'note': ['not a template']}).to_excel(writer, sheet_name='Notes', index=False)
+    before = {data_type: manager.get_version(data_type) for data_type in manager.templates}
+    stored = {data_type: len(manager.load_existing_data(data_type)) for data_type in uploads}
+
+    # Several chunks per sheet, but each dataset publishes one new version
+    success, message, results = manager.ingest_workbook(str(workbook), 'cli', mode='merge', chunk_rows=5)
+    assert success and 'Notes' in message, message
+    assert list(results) == list(uploads)
+    for data_type in manager.templates:
+        assert manager.get_version(data_type) == before[data_type] + (data_type in uploads)
+    for data_type, rows in uploads.items():
+        assert len(manager.load_existing_data(data_type)) == stored[data_type] + len(rows)
+
+
+def test_zip_ingest_writes_members_in_parallel_and_bumps_versions_once(manager, tmp_path):
+    new_values = [f'ZIP row {i}' for i in range(12)]
+    uploads = {
+        'AI TKT': raw_csv(manager, 'AI TKT').head(12).assign(Unit=new_values),
+        'CR (Corporate Relations)': raw_csv(manager, 'CR (Corporate Relations)').head(12).assign(Job_role=new_values),
+    }
+    archive = tmp_path / 'templates.zip'
+    with zipfile.ZipFile(archive, 'w') as zf:
+        for data_type, rows in uploads.items():
+            zf.writestr('templates/' + manager.templates[data_type]['filename'], rows.to_csv(index=False))
+        zf.writestr('templates/readme.txt', 'not a template')
+    before = {data_type: manager.get_version(data_type) for data_type in manager.templates}
+    stored = {data_type: len(manager.load_existing_data(data_type)) for data_type in uploads}
+
+    progress = []
+    success, message, results = manager.ingest_zip(str(archive), 'cli', mode='merge',
+                                                   progress=lambda done, total, data_type: progress.append((done, total)))
+    assert success and 'readme.txt' in message, message
+    assert list(results) == list(uploads)
+    assert progress == [(1, 2), (2, 2)]
+    for data_type in manager.templates:
+        assert manager.get_version(data_type) == before[data_type] + (data_type in uploads)
+    for data_type, rows in uploads.items():
+        assert len(manager.load_existing_data(data_type)) == stored[data_type] + len(rows)
+
+
+def test_write_queue_batches_only_overlapping_writes():
+    queue = WriteQueue()
+    started, release, batches = threading.Event(), threading.Event(), []
+
+    def write_batch(items):
+        batches.append(list(items))
+        if len(batches) == 1:
+            started.set()
+            release.wait(5)
+        return [item * 10 for item in items]
+
+    assert queue.submit(1, lambda items: [item * 10 for item in items]) == 10
+
+    results = {}
+    first = threading.Thread(target=lambda: results.setdefault(2, queue.submit(2, write_batch)))
+    first.start()
+    started.wait(5)
+    # Both arrive while the first write is in progress, so they are written together
+    others = [threading.Thread(target=lambda item=item: results.setdefault(item, queue.submit(item, write_batch)))
+              for item in (3, 4)]
+    for thread in others:
+        thread.start()
+    while len(queue.pending) < 2:
+        time.sleep(0.01)
+    release.set()
+    for thread in [first] + others:
+        thread.join(5)
+
+    assert batches[0] == [2] and sorted(batches[1]) == [3, 4]
+    assert results == {2: 20, 3: 30, 4: 40}
+
+
+def test_concurrent_appends_store_each_row_once(manager):
+    stored = manager.load_existing_data('AI Impact')
+    upload = raw_csv(manager, 'AI Impact').head(20).assign(
+        **{'Student _mail id': lambda df: 'concurrent' + df.index.astype(str) + '@spjain.edu'}
+    )
+    # Four overlapping uploads of 10 rows each, covering 20 distinct new rows
+    parts = [upload.iloc[start:start + 10] for start in (0, 5, 10, 10)]
+    threads = [threading.Thread(target=manager.append_data, args=(part, 'AI Impact', f'user{n}'))
+               for n, part in enumerate(parts)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(30)
+
+    assert len(manager.load_existing_data('AI Impact')) == len(stored) + 20
+
+
+def test_delete_and_restore_from_backup(manager):
+    original = manager.load_existing_data('AI TKT')
+    success, message = manager.delete_data('AI TKT', 'tester')
+    assert success, message
+    assert manager.load_existing_data('AI TKT').empty
+
+    backup = manager.list_backups('AI TKT')[0]
+    assert backup['reason'] == 'DELETE'
+    success, message = manager.restore_backup(backup['id'], 'tester')
+    assert success, message
+    pd.testing.assert_frame_equal(manager.load_existing_data('AI TKT'), original)
+    # Restoring backs up the (empty) content it replaces first
+    assert [entry['reason'] for entry in manager.list_backups('AI TKT')] == ['RESTORE', 'DELETE']
+
+
+def test_backup_retention_collects_unreferenced_objects(tmp_path):
+    store = BackupStore(str(tmp_path / 'backups'), keep_last=1, max_age_days=0)
+    data_file = tmp_path / 'data.csv'
+
+    def stored_objects():
+        return sorted(name.split('.')[0] for _, _, names in os.walk(store.objects_dir) for name in names)
+
+    data_file.write_text('a\n1\n')
+    first = store.backup('AI TKT', [str(data_file)], 'csv', 'tester', 'MANUAL')
+    # Identical content is stored once
+    store.backup('AI TKT', [str(data_file)], 'csv', 'tester', 'MANUAL')
+    assert stored_objects() == [first['files'][0]['sha256']]
+
+    data_file.write_text('a\n2\n')
+    second = store.backup('AI TKT', [str(data_file)], 'csv', 'tester', 'MANUAL')
+    assert [entry['id'] for entry in store.entries()] == [second['id']]
+    assert stored_objects() == [second['files'][0]['sha256']]
+    assert store.read_files(second) == [b'a\n2\n']
+
+
+def test_catalog_freshness_needs_no_content_hash(manager, monkeypatch):
+    expected = {data_type: manager.get_catalog(data_type) for data_type in manager.data_files}
+
+    def no_hashing(path):
+        raise AssertionError(f"{path} was hashed")
+
+    monkeypatch.setattr(data_manager, 'file_fingerprint', no_hashing)
+    assert {data_type: manager.get_catalog(data_type) for data_type in manager.data_files} == expected
+
+
+def test_old_versions_stay_readable_after_compaction_and_upsert(manager):
+    data_type = 'AI Impact'
+    raw = raw_csv(manager, data_type)
+    for batch in range(3):
+        rows = raw.head(4).assign(**{'Student _mail id': lambda df, b=batch: f'batch{b}_' + df.index.astype(str)})
+        manager.append_data(rows, data_type, 'tester')
+    before = {entry['version']: manager.load_as_of(data_type, version=entry['version'])
+              for entry in manager.list_versions(data_type)}
+    assert [len(df) for df in before.values()] == [500, 504, 508, 512]
+
+    assert manager.compact_data(data_type)
+    upload = raw.head(2).assign(CGPA=[1.5, 2.5])
+    _, success, message = manager.upsert_data(upload, data_type, 'tester')
+    assert success and message.startswith('Updated 2 records')
+
+    filename = manager.storage_files[data_type]
+    manifest = manager.storage._manifest(filename)
+    # Every earlier version is now read from the current base: only the patch of 2 rows was added
+    assert all(entry['files'] == manifest['files'] for entry in manifest['versions'])
+    assert [delta['rows'] for delta in manifest['versions'][0]['deltas']] == [512]
+    for version, df in before.items():
+        pd.testing.assert_frame_equal(manager.load_as_of(data_type, version=version), df)
+    assert manager.load_existing_data(data_type)['CGPA'].head(2).tolist() == [1.5, 2.5]
+
+
+def test_snapshot_keeps_retired_files_until_readers_are_done(manager, monkeypatch):
+    storage, path = manager.storage, manager.storage_files['AI TKT']
+    # No history is retained, so compaction retires every file of the previous version
+    monkeypatch.setattr(data_manager, 'HISTORY_RETENTION_DAYS', -1)
+    rows = raw_csv(manager, 'AI TKT').head(3).assign(Unit='Snapshot test')
+    manager.append_data(rows, 'AI TKT', 'tester')
+    before = storage.files(path)
+    assert len(before) == 2
+
+    assert manager.compact_data('AI TKT')
+    after = storage.files(path)
+    assert len(after) == 1 and after[0] not in before
+    # A reader that listed the files before compaction still reads the complete old version
+    assert len(storage.read_files(before)) == len(storage.read_files(after))
+    manifest = data_manager._read_json(storage.manifest_path(path), {})
+    assert sorted(manifest['retired']) == sorted(os.path.relpath(name, os.path.dirname(path)) for name in before)
+
+    # Once the grace period is over, the next published version deletes them
+    monkeypatch.setattr(data_manager, 'SNAPSHOT_RETENTION_SECONDS', -1)
+    manager.append_data(rows.assign(Unit='Snapshot test 2'), 'AI TKT', 'tester')
+    assert not any(os.path.exists(name) for name in before)
+    manifest = data_manager._read_json(storage.manifest_path(path), {})
+    assert manifest['retired'] == {}
+    assert [entry['files'] for entry in manifest['versions']] == [manifest['files']]
+
+
+@pytest.mark.parametrize('years, programs, campuses', [
+    (None, None, None),
+    ([2023], None, None),
+    ([2022, 2024], ['MGB', 'GCGM'], ['SG']),
+    (None, ['GMBA'], ['DXB', 'SYD']),
+    ([1999], None, None),
+])
+def test_filter_bitmaps_match_pandas_filter(manager, years, programs, campuses):
+    tutor = manager.load_existing_data('AI Tutor')
+    # AI Tutor has no Year column, so its year comes from the Cohort label
+    mask = np.ones(len(tutor), dtype=bool)
+    if years:
+        mask &= tutor['Cohort'].astype(str).map(cohort_year).isin(years).to_numpy()
+    if programs:
+        mask &= tutor['Course(GCGM/MGM/GMBA)'].isin(programs).to_numpy()
+    if campuses:
+        mask &= tutor['Campus (SG/MUM/SYD/DXB)'].isin(campuses).to_numpy()
+    pd.testing.assert_frame_equal(manager.query_data('AI Tutor', years, programs, campuses), tutor[mask])
+
+    cr = manager.load_existing_data('CR (Corporate Relations)')
+    mask = np.ones(len(cr), dtype=bool)
+    if years:
+        mask &= cr['Year'].isin(years).to_numpy()
+    if programs:
+        mask &= cr['Course'].isin(programs).to_numpy()
+    # CR has no campus column, so a campus selection excludes nothing
+    pd.testing.assert_frame_equal(manager.query_data('CR (Corporate Relations)', years, programs, campuses), cr[mask])
+
+
+def test_cached_view_drops_views_of_older_versions(manager):
+    path = manager.storage_files['AI Tutor']
+    manager.cached_view('AI Tutor', ('rows',), len)
+    manager.cached_view('AI Tutor', ('columns',), lambda df: list(df.columns))
+
+    # Another process bumps the version on disk, so nothing here evicted the old views
+    versions = data_manager._read_json(manager.versions_file, {})
+    versions['AI Tutor'] = versions.get('AI Tutor', 0) + 1
+    data_manager._write_json(manager.versions_file, versions)
+
+    assert manager.cached_view('AI Tutor', ('rows',), len) == len(manager.load_existing_data('AI Tutor'))
+    assert [key for key in data_manager._view_cache if key[0] == path] == [(path, versions['AI Tutor'], ('rows',))]
+
+
+def test_append_merges_new_dimension_values_into_the_catalog(manager, monkeypatch):
+    data_type = 'CR (Corporate Relations)'
+    before = manager.get_filter_values(data_type)
+    assert 'Exec MBA' not in before['program'] and 2031 not in before['year']
+
+    rows = raw_csv(manager, data_type).head(2).assign(Course='Exec MBA', Year=2031)
+    _, success, message = manager.append_data(rows, data_type, 'tester')
+    assert success, message
+
+    # The dictionary is merged on write, so reading it needs no stored rows
+    def no_scan(*args, **kwargs):
+        raise AssertionError("stored rows were read")
+
+    with monkeypatch.context() as patched:
+        for method in ('load_existing_data', 'load_cached_data', 'dimensions'):
+            patched.setattr(manager, method, no_scan)
+        after = manager.get_filter_values(data_type)
+    assert after == data_manager.dimension_values(manager.load_existing_data(data_type))
+    assert 'Exec MBA' in after['program'] and 2031 in after['year']
+
+
+def test_filtered_view_cache_evicts_least_recently_used():
+    view = pd.DataFrame({'value': np.arange(100, dtype='int64')})
+    size = int(view.memory_usage(deep=True).sum())
+    cache = FilteredViewCache(max_bytes=2 * size)
+
+    cache.put(('a.parquet', 1, 'x'), view)
+    cache.put(('a.parquet', 1, 'y'), view)
+    assert cache.get(('a.parquet', 1, 'x')) is view
+    # 'y' is now the least recently used, so it makes room for 'z'
+    cache.put(('b.parquet', 1, 'z'), view)
+    assert cache.get(('a.parquet', 1, 'y')) is None
+    assert cache.stats()['evictions'] == 1
+
+    cache.discard('a.parquet')
+    assert cache.get(('a.parquet', 1, 'x')) is None
+    assert cache.get(('b.parquet', 1, 'z')) is view
+    stats = cache.stats()
+    assert (stats['entries'], stats['bytes'], stats['invalidations']) == (1, size, 1)
+
+
+def test_query_results_follow_dataset_changes(manager):
+    before = manager.query_data('CR (Corporate Relations)', programs=['MGB'])
+    rows = raw_csv(manager, 'CR (Corporate Relations)').head(1).assign(Course='MGB', Job_role='New role')
+    manager.append_data(rows, 'CR (Corporate Relations)', 'tester')
+    after = manager.query_data('CR (Corporate Relations)', programs=['MGB'])
+    assert len(after) == len(before) + 1
+    assert manager.filtered_view_stats()['invalidations'] >= 1
+
+
+def test_append_after_upsert_skips_the_updated_row(manager):
+    data_type = 'PRP (Placement Readiness Program)'
+    raw = raw_csv(manager, data_type)
+    # Probe first, so the sorted row hashes are cached in memory before the upsert
+    assert manager.count_duplicates(raw.head(1), data_type)['already_stored'] == 1
+
+    updated = raw.head(1).assign(**{'Term-1': 11.5})
+    _, success, message = manager.upsert_data(updated, data_type, 'tester')
+    assert success and message.startswith('Updated 1 records')
+    assert manager.count_duplicates(raw.head(1), data_type)['new'] == 1
+    assert manager.count_duplicates(updated, data_type)['already_stored'] == 1
+
+    manager.append_data(updated, data_type, 'tester')
+    assert len(manager.load_existing_data(data_type)) == len(raw)
+
+
+def test_sql_store_queries_match_pandas_and_take_appends_incrementally(manager, tmp_path, monkeypatch):
+    sql_manager = DataManager(sql_store_path=str(tmp_path / 'store.db'))
+    selections = [(None, None, None), ([2023], ['MGB'], None), (None, ['GMBA'], ['SG', 'DXB'])]
+
+    def assert_same_rows(data_type):
+        for years, programs, campuses in selections:
+            # Both managers share the filtered-view cache, so clear it before each path runs
+            data_manager._filtered_views.discard(manager.storage_files[data_type])
+            actual = sql_manager.query_data(data_type, years, programs, campuses).reset_index(drop=True)
+            data_manager._filtered_views.discard(manager.storage_files[data_type])
+            expected = manager.query_data(data_type, years, programs, campuses).reset_index(drop=True)
+            pd.testing.assert_frame_equal(actual, expected, check_dtype=False, check_categorical=False)
+
+    assert_same_rows('AI Tutor')
+    assert_same_rows('CR (Corporate Relations)')
+
+    # With the table current, an append inserts only the new rows instead of rewriting the table
+    def no_rewrite(*args):
+        raise AssertionError("SQL table was rewritten")
+
+    monkeypatch.setattr(sql_manager.sql_store, 'write', no_rewrite)
+    rows = raw_csv(manager, 'CR (Corporate Relations)').head(2).assign(Job_role='SQL append test')
+    appended, success, message = sql_manager.append_data(rows, 'CR (Corporate Relations)', 'tester')
+    assert success and len(appended) == 2, message
+    assert_same_rows('CR (Corporate Relations)')
+    assert sql_manager.sql_store.get_version('CR (Corporate Relations)') == sql_manager.get_version('CR (Corporate Relations)')